@@ -0,0 +1,50 @@
+"""
+Compare memory retained by parsed tables in the default and compact
+row representations
+
+usage: python benchmarks/bench_memory.py [rows]
+"""
+import gc
+import os
+import sys
+import random
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import mwparserfromhell as mwp  # pylint: disable=wrong-import-position
+
+from wikitables import WikiTable  # pylint: disable=wrong-import-position
+from wikitables.util import ftag  # pylint: disable=wrong-import-position
+from corpus import table  # pylint: disable=wrong-import-position
+
+
+def measure(source, **kwargs):
+    gc.collect()
+    tracemalloc.start()
+    node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+    parsed = WikiTable('bench', node, **kwargs)
+    del node
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return parsed, retained, peak
+
+
+def main():
+    nrows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    source = table(random.Random(0), rows=nrows, cols=10)
+    ncells = nrows * 10
+
+    for label, kwargs in (('default', {}),
+                          ('compact', {'compact': True}),
+                          ('default, no raw', {'keep_raw': False}),
+                          ('compact, no raw', {'compact': True, 'keep_raw': False})):
+        parsed, retained, peak = measure(source, **kwargs)
+        print('%-16s retained %7.1f MiB (%4d bytes/cell)  peak %7.1f MiB' % (
+            label, retained / 2.0 ** 20, retained / ncells, peak / 2.0 ** 20))
+        del parsed
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+"""
+Measure table import throughput of ParallelImporter by worker count
+
+usage: python benchmarks/bench_parallel.py [max workers]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from wikitables import _read_page_tables  # pylint: disable=wrong-import-position
+from wikitables.parallel import ParallelImporter  # pylint: disable=wrong-import-position
+from corpus import article  # pylint: disable=wrong-import-position
+
+
+def pages(count=32):
+    for n in range(count):
+        body = article(seed=n, sections=10, tables=4, rows=100, cols=8)
+        yield 'Article %d' % n, {'title': 'Article %d' % n, 'revisions': [{'*': body}]}
+
+
+def main():
+    max_workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    corpus = list(pages())
+
+    start = time.time()
+    nrows = sum(len(t.rows) for _, page in corpus for t in _read_page_tables(page, 'en'))
+    base = time.time() - start
+    print('serial:     %6.2fs  %8.0f rows/s' % (base, nrows / base))
+
+    workers = 1
+    while workers <= max_workers:
+        importer = ParallelImporter(workers=workers)
+        start = time.time()
+        count = sum(len(t.rows) for _, tables in importer.import_pages(corpus) for t in tables)
+        elapsed = time.time() - start
+        assert count == nrows
+        print('%2d workers: %6.2fs  %8.0f rows/s  (%.1fx)' % (
+            workers, elapsed, nrows / elapsed, base / elapsed))
+        workers *= 2
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,39 @@
+"""
+Compare parsing tables from a long article in full against parsing only
+the table regions found by the scanner
+
+usage: python benchmarks/bench_scanner.py
+"""
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import mwparserfromhell as mwp  # pylint: disable=wrong-import-position
+
+from wikitables import WikiTable  # pylint: disable=wrong-import-position
+from wikitables.scanner import parse_tables  # pylint: disable=wrong-import-position
+from wikitables.util import ftag  # pylint: disable=wrong-import-position
+from corpus import article  # pylint: disable=wrong-import-position
+
+
+def full_parse(text):
+    return mwp.parse(text).filter_tags(matches=ftag('table'))
+
+
+def main():
+    for sections, tables in ((20, 4), (80, 8), (200, 10)):
+        text = article(sections=sections, tables=tables)
+        full = [WikiTable('t', n).json() for n in full_parse(text)]
+        scanned = [WikiTable('t', n).json() for n in parse_tables(text)]
+        assert full == scanned, 'scanned tables differ from full parse'
+
+        t_full = min(timeit.repeat(lambda: full_parse(text), number=1, repeat=5))
+        t_scan = min(timeit.repeat(lambda: parse_tables(text), number=1, repeat=5))
+        print('%7d bytes, %2d tables: full %.4fs  scanned %.4fs  (%.1fx)' % (
+            len(text), tables, t_full, t_scan, t_full / t_scan))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+Compare per-value cost of wikitables.util.guess_type and
+wikitables.inference.TypeInferer on text-heavy and numeric cell values,
+and of per-cell and per-column inference when parsing a table
+
+usage: python benchmarks/bench_types.py [values]
+"""
+import os
+import sys
+import time
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import mwparserfromhell as mwp  # pylint: disable=wrong-import-position
+
+from wikitables import WikiTable  # pylint: disable=wrong-import-position
+from wikitables.inference import TypeInferer  # pylint: disable=wrong-import-position
+from wikitables.util import ftag, guess_type  # pylint: disable=wrong-import-position
+from corpus import sentence, table  # pylint: disable=wrong-import-position
+
+
+def timeit(fn, values):
+    start = time.time()
+    for value in values:
+        fn(value)
+    return time.time() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    rnd = random.Random(0)
+    samples = (
+        ('text', [sentence(rnd, 3) for _ in range(count)]),
+        ('int', [str(rnd.randint(0, 10**7)) for _ in range(count)]),
+        ('signed', [str(rnd.randint(-10**4, 10**4)) for _ in range(count)]),
+        ('grouped', ['{:,}'.format(rnd.randint(0, 10**7)) for _ in range(count)]),
+        ('float', ['%.2f' % rnd.uniform(0, 1000) for _ in range(count)]),
+    )
+
+    # as called by readers, bound rather than through __call__
+    infer = TypeInferer('en').guess
+    for label, values in samples:
+        base = timeit(guess_type, values)
+        elapsed = timeit(infer, values)
+        print('%-7s guess_type %6.0f ns/value  TypeInferer %6.0f ns/value  (%.1fx)' % (
+            label, base / count * 1e9, elapsed / count * 1e9, base / elapsed))
+
+    source = table(rnd, rows=2000, cols=10)
+    for label, kwargs in (('per cell', {}), ('per column', {'sample': 20})):
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        start = time.time()
+        WikiTable('bench', node, **kwargs)
+        print('%-10s table parse %6.2fs' % (label, time.time() - start))
+
+
+if __name__ == '__main__':
+    main()
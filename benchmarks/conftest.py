@@ -0,0 +1,75 @@
+"""
+Shared fixtures for the pytest-benchmark suite
+
+usage: pip install -r bench-requirements.txt
+       pytest benchmarks/ [--benchmark-only] [--benchmark-save=<name>]
+"""
+import os
+import sys
+import random
+import tracemalloc
+
+import pytest
+
+try:
+    import pytest_benchmark  # pylint: disable=unused-import
+except ImportError:
+    raise pytest.UsageError(
+        'the benchmark suite requires pytest-benchmark: '
+        'pip install -r bench-requirements.txt') from None
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import mwparserfromhell as mwp  # pylint: disable=wrong-import-position
+
+from wikitables.util import ftag  # pylint: disable=wrong-import-position
+from corpus import table  # pylint: disable=wrong-import-position
+
+
+# synthetic table shapes, by name
+SHAPES = {
+    'plain': dict(rows=500, cols=8, flags=False),
+    'flags': dict(rows=500, cols=8),
+    'spans': dict(rows=500, cols=8, rowspans=0.2),
+    'templates': dict(rows=500, cols=8, templates=0.5),
+    'nested': dict(rows=200, cols=8, nested=0.3),
+}
+
+
+def parse_table(source):
+    """ Return the first top-level table node of the given wikitext """
+    return mwp.parse(source).filter_tags(matches=ftag('table'), recursive=False)[0]
+
+
+def count_rows(node):
+    """ Return the number of top-level rows of a table node """
+    return len(node.contents.filter_tags(matches=ftag('tr'), recursive=False))
+
+
+@pytest.fixture(params=sorted(SHAPES))
+def shape(request):
+    """ (name, wikitext) of a synthetic table for each shape in SHAPES """
+    return request.param, table(random.Random(0), **SHAPES[request.param])
+
+
+@pytest.fixture
+def report(benchmark):
+    """
+    Return a function running a benchmark and recording its rows/s and
+    peak memory, from a separate untimed run under tracemalloc
+    """
+    def run(fn, rows, *args):
+        tracemalloc.start()
+        fn(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        result = benchmark(fn, *args)
+        benchmark.extra_info['rows'] = rows
+        benchmark.extra_info['peak_memory_mib'] = round(peak / 2.0 ** 20, 2)
+        stats = getattr(benchmark, 'stats', None)
+        if stats is not None and stats.stats.mean:
+            benchmark.extra_info['rows_per_s'] = round(rows / stats.stats.mean)
+        return result
+    return run
@@ -0,0 +1,112 @@
+# Synthetic wikitext generators for benchmarks
+import os
+import random
+
+WORDS = (
+    'city region population census estimate river province municipality '
+    'history century founded located north south east west capital island '
+    'economy industry culture church castle bridge square museum university'
+).split()
+
+
+def sentence(rnd, words=12):
+    return ' '.join(rnd.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def prose(rnd, paragraphs=10, refs=True):
+    out = []
+    for _ in range(paragraphs):
+        parts = []
+        for _ in range(6):
+            parts.append(sentence(rnd))
+            if refs and rnd.random() < 0.3:
+                parts.append('<ref>{{cite web|url=https://example.org/%d|title=%s}}</ref>'
+                             % (rnd.randint(0, 10**6), sentence(rnd, 4)))
+        out.append(' '.join(parts))
+    return '\n\n'.join(out)
+
+
+def table(rnd, rows=50, cols=6, rowspans=0.0, templates=0.0, flags=True, nested=0.0):
+    """
+    Return a wikitable with a header row, a linked name column, a flag
+    column and numeric columns
+    params:
+     - rowspans(float): Probability of a numeric cell spanning 2-3 rows
+     - templates(float): Probability of a numeric cell wrapped in a template
+     - flags(bool): Whether the second column holds {{flag}} templates
+     - nested(float): Probability of a row ending in a nested table
+    """
+    lines = ['{| class="wikitable sortable"']
+    lines.append('! ' + ' !! '.join('Column %d' % c for c in range(cols)))
+    covered = [0] * cols  # per column, rows remaining under a rowspan
+    for _ in range(rows):
+        lines.append('|-')
+        cells = ['[[%s]]' % rnd.choice(WORDS).capitalize()]
+        cells.append('{{flag|Italy}}' if flags else rnd.choice(WORDS))
+        for col in range(2, cols):
+            value = '{:,}'.format(rnd.randint(0, 10**7))
+            if covered[col]:
+                covered[col] -= 1
+                continue
+            if templates and rnd.random() < templates:
+                value = _template_cell(rnd, value)
+            if rowspans and rnd.random() < rowspans:
+                covered[col] = rnd.randint(1, 2)
+                value = 'rowspan="%d" | %s' % (covered[col] + 1, value)
+            cells.append(value)
+        if nested and rnd.random() < nested:
+            # cells holding a nested table are written one per line
+            cells[-1] += '\n' + _nested_table(rnd)
+            lines.extend('| ' + cell for cell in cells)
+            continue
+        lines.append('| ' + ' || '.join(cells))
+    lines.append('|}')
+    return '\n'.join(lines)
+
+
+def _template_cell(rnd, value):
+    choice = rnd.randint(0, 2)
+    if choice == 0:
+        return '{{nts|%s}}' % value.replace(',', '')
+    if choice == 1:
+        return '{{sort|%s|%s}}' % (value.replace(',', ''), value)
+    return '%s{{efn|%s}}' % (value, sentence(rnd, 4))
+
+
+def _nested_table(rnd):
+    return '{| class="wikitable"\n| %s || %s\n|-\n| %d || %d\n|}' % (
+        rnd.choice(WORDS), rnd.choice(WORDS), rnd.randint(0, 99), rnd.randint(0, 99))
+
+
+def article(seed=0, sections=20, tables=4, rows=50, cols=6):
+    """
+    Return a long article with an infobox, prose-heavy sections with
+    references, and the given number of tables spread between sections
+    """
+    rnd = random.Random(seed)
+    out = ['{{Infobox settlement\n| name = Example\n| population = 1,234\n}}',
+           prose(rnd, 3)]
+    table_at = set(rnd.sample(range(sections), min(tables, sections)))
+    for n in range(sections):
+        out.append('== Section %d ==' % n)
+        out.append(prose(rnd, 8))
+        if n in table_at:
+            out.append(table(rnd, rows, cols))
+    out.append('== References ==\n{{reflist}}')
+    return '\n\n'.join(out)
+
+
+SNAPSHOT_DIR = os.path.join(os.path.dirname(__file__), 'snapshots')
+
+
+def snapshots():
+    """
+    Return a dict mapping names to the wikitext of vendored article
+    snapshots, from the .wiki files in the snapshots directory
+    """
+    out = {}
+    for fname in sorted(os.listdir(SNAPSHOT_DIR)):
+        if fname.endswith('.wiki'):
+            with open(os.path.join(SNAPSHOT_DIR, fname), encoding='utf-8') as f:
+                out[fname[:-len('.wiki')]] = f.read()
+    return out
@@ -0,0 +1,19 @@
+"""
+Benchmarks of table JSON output
+"""
+import io
+
+from wikitables import WikiTable
+from conftest import parse_table
+
+
+def test_json(report, shape):
+    _, source = shape
+    table = WikiTable('bench', parse_table(source))
+    report(table.json, len(table.rows))
+
+
+def test_ndjson(report, shape):
+    _, source = shape
+    table = WikiTable('bench', parse_table(source))
+    report(lambda: table.ndjson(io.StringIO()), len(table.rows))
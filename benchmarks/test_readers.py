@@ -0,0 +1,61 @@
+"""
+Benchmarks of parsing stages: wikitext parsing, header detection, row and
+field reading, and template reading
+"""
+import pytest
+import mwparserfromhell as mwp
+
+from wikitables import WikiTable
+from wikitables.countries import get_translation
+from wikitables.readers import FieldReader, RowReader
+from wikitables.templates import read_template
+from wikitables.util import ftag
+from conftest import parse_table, count_rows
+
+
+def test_mwp_parse(report, shape):
+    _, source = shape
+    report(mwp.parse, count_rows(parse_table(source)), source)
+
+
+def test_header(report, shape):
+    _, source = shape
+    node = parse_table(source)
+    rows = count_rows(node)
+    report(WikiTable, rows, 'bench', node, 'en', True)
+
+
+def test_row_reader(report, shape):
+    _, source = shape
+    table = WikiTable('bench', parse_table(source), lazy=True)
+    nodes = list(table._tr_nodes)
+
+    def read():
+        return list(RowReader('bench', table.head).parse(*nodes))
+    report(read, count_rows(parse_table(source)))
+
+
+def test_field_reader(report, shape):
+    _, source = shape
+    node = parse_table(source)
+    rows = count_rows(node)
+    cells = node.contents.filter_tags(matches=ftag('td'))
+    reader = FieldReader('en')
+
+    def read():
+        return [f for cell in cells for f in reader.parse(cell)]
+    report(read, rows)
+
+
+def test_read_template(report, shape):
+    _, source = shape
+    node = parse_table(source)
+    rows = count_rows(node)
+    templates = node.contents.filter_templates()
+    if not templates:
+        pytest.skip('no templates in table')
+    translate_fn = get_translation('en').gettext
+
+    def read():
+        return [read_template(t, translate_fn) for t in templates]
+    report(read, rows)
@@ -0,0 +1,16 @@
+"""
+Benchmarks of importing all tables from vendored article snapshots
+"""
+import pytest
+
+from wikitables import _parse_page_tables
+from corpus import snapshots
+
+SNAPSHOTS = snapshots()
+
+
+@pytest.mark.parametrize('name', sorted(SNAPSHOTS))
+def test_snapshot(report, name):
+    page = {'title': name, 'revisions': [{'*': SNAPSHOTS[name]}]}
+    rows = sum(len(t.rows) for t in _parse_page_tables(page, 'en'))
+    report(_parse_page_tables, rows, page, 'en')
@@ -14,13 +14,21 @@ setup(name='wikitables',
           'requests>=2.9.1',
           'pycountry>=20.7.3'
       ],
+      python_requires='>=3.6',
+      extras_require={
+          'async': ['aiohttp>=3.6.0'],
+          'numpy': ['numpy>=1.14.0'],
+          'pandas': ['numpy>=1.14.0', 'pandas>=1.0.0'],
+          'arrow': ['numpy>=1.14.0', 'pyarrow>=1.0.0'],
+          'orjson': ['orjson>=3.0.0'],
+      },
       license='http://opensource.org/licenses/MIT',
       classifiers=(
           'Natural Language :: English',
           'Programming Language :: Python',
           'Intended Audience :: Developers',
-          'Programming Language :: Python :: 2',
           'Programming Language :: Python :: 3',
+          'Programming Language :: Python :: 3.6',
           'License :: OSI Approved :: MIT License',
       ),
       keywords='wikipedia data cli commandline',
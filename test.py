@@ -1,9 +1,50 @@
+import gc
+import io
+import bz2
 import json
+import pickle
+import asyncio
+import tempfile
+import time
+import weakref
 import unittest
+from unittest import mock
+from urllib.parse import urlparse, parse_qsl
 
+import requests
 import mwparserfromhell as mwp
+from requests.adapters import HTTPAdapter
 
-from wikitables import ftag, WikiTable
+from wikitables import ftag, WikiTable, CellMemo, import_tables, _read_page_tables, \
+    _stream_page_tables
+from wikitables.util import TableJSONEncoder
+from wikitables.models import CompactRow
+from wikitables.client import Client, ArticleNotFound
+from wikitables import aio
+from wikitables import cli
+from wikitables.cache import DirectoryCache, SQLiteCache
+from wikitables.scanner import scan_tables, parse_tables
+from wikitables.index import TableIndex
+from wikitables.parallel import ParallelImporter
+from wikitables import dump
+from wikitables import serialize
+from wikitables import fastpath
+from wikitables import templates
+from wikitables.templates import register_template_reader
+from wikitables.inference import TypeInferer
+from wikitables.stats import ImportStats
+from wikitables.countries import get_translation
+
+try:
+    from aiohttp import web
+except ImportError:
+    web = None
+
+try:
+    import pandas as pd
+    import pyarrow as pa
+except ImportError:
+    pd = pa = None
 
 
 class TestWikiTables(unittest.TestCase):
@@ -89,6 +130,629 @@ class TestWikiTables(unittest.TestCase):
         table = self._load(source)
         self._compare(table, expected)
 
+    def test_table_dump_load(self):
+        source = """
+{| class="wikitable"
+! Rank !! City !! State
+|-
+| 1 || '''[[São Paulo]]''' || {{flag|São Paulo}}
+|-
+| 2 || '''[[Rio de Janeiro]]''' || {{flag|Rio de Janeiro}}
+|}
+"""
+        table = self._load(source)
+        loaded = WikiTable.load(pickle.loads(pickle.dumps(table.dump())))
+        self.assertEqual(loaded.name, table.name)
+        self.assertEqual(loaded.head, table.head)
+        self.assertEqual(loaded.json(), table.json())
+        self.assertIsNone(loaded._reparsed)
+        self.assertEqual(str(loaded.rows[1]['City'].raw), str(table.rows[1]['City'].raw))
+        self.assertEqual(str(loaded.rows[0].raw), str(table.rows[0].raw))
+
+    def test_table_cache(self):
+        source = """
+{| class="wikitable"
+! Name !! Value
+|-
+| a || 1
+|}
+"""
+        page = {'title': 'Foo', 'revisions': [{'revid': 10, '*': source}]}
+        with tempfile.TemporaryDirectory() as path:
+            cache = DirectoryCache(path)
+            parsed = _read_page_tables(page, 'en', cache)
+            cached = _read_page_tables(page, 'en', cache)
+
+        self.assertEqual(cache.stats['misses'], 1)
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cached[0].name, 'Foo[0]')
+        self.assertEqual(cached[0].json(), parsed[0].json())
+
+    def test_table_cache_options(self):
+        source = "{|\n! Name !! Value\n|-\n| a || 1\n|}"
+        page = {'title': 'Foo', 'revisions': [{'revid': 10, '*': source}]}
+        with tempfile.TemporaryDirectory() as path:
+            cache = DirectoryCache(path)
+            renamed = _read_page_tables(page, 'en', cache, head=['foo', 'bar'])
+            compact = _read_page_tables(page, 'en', cache, compact=True, infer=str)
+            plain = _read_page_tables(page, 'en', cache, fast=True)
+            cached = _read_page_tables(page, 'en', cache, stats=ImportStats())
+            compact_cached = _read_page_tables(page, 'en', cache, compact=True)
+
+        self.assertEqual((cache.stats['misses'], cache.stats['hits']), (1, 1))
+        self.assertEqual(renamed[0].head, ['foo', 'bar'])
+        self.assertIsInstance(compact[0].rows[0], CompactRow)
+        self.assertEqual(compact[0].rows[0]['Value'].value, '1')
+        self.assertEqual(plain[0].head, ['Name', 'Value'])
+        self.assertEqual(cached[0].json(), plain[0].json())
+        self.assertIsInstance(compact_cached[0].rows[0], CompactRow)
+
+    def test_scan_tables(self):
+        source = """
+Intro text <!-- {| not a table --> with a <nowiki>{|</nowiki>
+  {| class="wikitable"
+! Name !! Nested
+|-
+| a ||
+{|
+| inner
+|}
+|}
+|}}
+<table><tr><td>html</td></tr></table>
+"""
+        spans = scan_tables(source)
+        self.assertEqual([depth for _, _, depth in spans], [0, 1, 0])
+
+        expected = mwp.parse(source).filter_tags(matches=ftag('table'))
+        tables = parse_tables(source)
+        self.assertEqual([str(t) for t in tables], [str(t) for t in expected])
+
+        # a template closing at the start of a line does not close the table
+        source = '{|\n! a !! b\n|-\n| {{foo\n|}} || 2\n|}'
+        self.assertEqual(scan_tables(source), [(0, len(source), 0)])
+        expected = mwp.parse(source).filter_tags(matches=ftag('table'))
+        self.assertEqual([str(t) for t in parse_tables(source)], [str(t) for t in expected])
+        self.assertEqual([str(t) for t in fastpath.iter_tables(source)], [source])
+        self.assertEqual(TableIndex.from_text('Test', source)[0].table.head, ['a', 'b'])
+
+    def test_table_index(self):
+        source = """
+{| class="wikitable sortable"
+|+ style="text-align:left" | Largest [[city|cities]]
+! Name !! Population
+|-
+| Rome || 2,856,133
+|}
+
+{| class="infobox"
+| a || b
+|}
+
+<table class="wikitable"><caption>Html</caption><tr><td>x</td></tr></table>
+"""
+        index = TableIndex.from_text('Test', source)
+        self.assertEqual([h.name for h in index], ['Test[0]', 'Test[1]', 'Test[2]'])
+        self.assertEqual(index[0].classes, ['wikitable', 'sortable'])
+        self.assertEqual(index[0].caption, 'Largest cities')
+        self.assertIsNone(index[1].caption)
+        self.assertEqual(index[2].caption, 'Html')
+
+        selected = index.select(cls='wikitable', caption='^Largest')
+        self.assertEqual(selected, [index[0]])
+        self.assertEqual([h.index for h in index.select(cls='wikitable')], [0, 2])
+        self.assertTrue(all(h._table is None for h in index))
+
+        handle = index[0]
+        self.assertEqual(handle.ncols, 2)
+        self.assertIsNone(handle.table._rows)
+        self.assertEqual(json.loads(handle.json()), [{'Name': 'Rome', 'Population': 2856133}])
+
+        # read options are passed to the tables of lazy imports
+        page = {'title': 'Test', 'revisions': [{'*': source}]}
+        with mock.patch('wikitables.Client.fetch_page', return_value=page):
+            index = import_tables('Test', lazy=True, fast=True, compact=True,
+                                  columns=['Name'], where={'Population': 2856133})
+            self.assertRaises(TypeError, import_tables, 'Test', lazy=True, colums=['Name'])
+            self.assertRaises(ValueError, import_tables, 'Test', lazy=True, table_cache={})
+        self.assertEqual(index[0].head, ['Name'])
+        self.assertIsInstance(index[0].table._node, fastpath.FastTable)
+        self.assertIsInstance(index[0].rows[0], CompactRow)
+        self.assertEqual(json.loads(index[0].json()), [{'Name': 'Rome'}])
+
+    def test_nested_rows(self):
+        source = """
+{| class="wikitable"
+! Round !! Fixtures
+|-
+| 1 ||
+{| class="wikitable"
+! Home !! Away
+|-
+| a || b
+|}
+|-
+| 2 || none
+|}
+"""
+        table = self._load(source)
+        self.assertEqual(table.head, ['Round', 'Fixtures'])
+        self.assertEqual([r['Round'].value for r in table.rows], [1, 2])
+        self.assertEqual(table.rows[0]['Fixtures'].value, 'Home Away a b')
+
+        source = '<table><tbody><tr><th>A</th><th>B</th></tr><tr><td>1</td><td>2</td></tr></tbody></table>'
+        self._compare(self._load(source), [{'A': 1, 'B': 2}])
+
+        self._compare(self._load('{|\n|-\n| a || b\n|}'), [{'column0': 'a', 'column1': 'b'}])
+
+    def test_multi_header(self):
+        source = """
+{| class="wikitable"
+! rowspan="2" | Party
+! colspan="2" | Constituency
+! colspan="2" | List
+|-
+! Votes !! Seats
+! Votes !! Seats
+|-
+| Labour || 1,204 || 41 || 1,110 || 7
+|}
+"""
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        table = WikiTable("Test Table", node, multi_header=True)
+        self.assertEqual(table.head, ['Party', 'Constituency Votes', 'Constituency Seats',
+                                      'List Votes', 'List Seats'])
+        self.assertEqual(len(table.rows), 1)
+        self.assertEqual(table.rows[0]['List Votes'].value, 1110)
+
+        loaded = WikiTable.load(table.dump())
+        self.assertEqual(str(loaded.rows[0]['Party'].raw), str(table.rows[0]['Party'].raw))
+
+        source = "{|\n! colspan=2 | Name\n|-\n| a || b\n|}"
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        self.assertEqual(WikiTable("Test Table", node, multi_header=True).head, ['Name', 'Name_2'])
+
+    def test_row_col_span(self):
+        source = """
+{| class="wikitable"
+! A !! B !! C !! D
+|-
+| rowspan="2" | a1 || colspan="2" | bc1 || d1
+|-
+| b2 || rowspan="0" | c2 || d2
+|-
+| colspan="2" | ab3 || d3
+|}
+"""
+        expected = [
+            {'A': 'a1', 'B': 'bc1', 'C': 'bc1', 'D': 'd1'},
+            {'A': 'a1', 'B': 'b2', 'C': 'c2', 'D': 'd2'},
+            {'A': 'ab3', 'B': 'ab3', 'C': 'c2', 'D': 'd3'},
+        ]
+        table = self._load(source)
+        self._compare(table, expected)
+        self.assertEqual([[str(f) for f in cells] for cells in table.grid],
+                         [[r[k] for k in table.head] for r in expected])
+
+        # a column spanned by both a rowspan and a colspan is used up once
+        table = self._load('{|\n! a !! b !! c\n|-\n| 1 || rowspan=2 | B || 3\n'
+                           '|-\n| colspan=2 | X || 6\n|-\n| 7 || 8 || 9\n|}')
+        self.assertEqual(json.loads(table.json())[1:], [
+            {'a': 'X', 'b': 'X', 'c': 6},
+            {'a': 7, 'b': 8, 'c': 9},
+        ])
+
+        # columns spanned by a single header cell are numbered
+        table = self._load('{|\n! Name !! colspan=2 | Score !! Total\n|-\n| a || 1 || 2 || 3\n|}')
+        self.assertEqual(table.head, ['Name', 'Score', 'Score_2', 'Total'])
+        self.assertEqual(json.loads(table.json()),
+                         [{'Name': 'a', 'Score': 1, 'Score_2': 2, 'Total': 3}])
+
+        # spans are clamped, and non-positive column spans read as 1
+        source = '{|\n! A !! B\n|-\n| colspan="1000000000" | a || b\n' \
+            '|-\n| colspan="0" | c || rowspan="-1" | d\n|-\n| e || f\n|}'
+        table = self._load(source)
+        self.assertEqual(len(table.grid[0]), 1001)
+        self.assertEqual([[str(f) for f in cells] for cells in table.grid[1:]],
+                         [['c', 'd'], ['e', 'f']])
+
+        # wide tables are aligned across rows
+        ncols = 200
+        source = '{|\n! ' + ' !! '.join('c%d' % n for n in range(ncols))
+        source += '\n|-\n| rowspan="2" | x || ' + ' || '.join(str(n) for n in range(1, ncols))
+        source += '\n|-\n| ' + ' || '.join(str(n) for n in range(1, ncols)) + '\n|}'
+        table = self._load(source)
+        self.assertEqual(table.rows[1]['c0'].value, 'x')
+        self.assertEqual(table.rows[1]['c%d' % (ncols - 1)].value, ncols - 1)
+
+    def test_fast_path(self):
+        source = """
+{| class="wikitable"
+|+ Largest cities
+! Rank !! [[City]] !! 2018<br>Estimate
+|-
+| 1 || '''''[[São Paulo]]''''' || 12,176,866
+|-
+| style="text-align:left" | 2 || [[Rio de Janeiro|Rio]] ''city'' || rowspan="2" | 6,688,927
+|-
+| 3 || [[Brasília|]]
+more text
+|}
+
+{| class="wikitable"
+! Round !! Fixtures
+|-
+| 1 ||
+{| class="wikitable"
+! Home !! Away
+|-
+| {{flag|Italy}} || b
+|}
+|}
+"""
+        page = {'title': 'Test', 'revisions': [{'*': source}]}
+        raw_tables = list(fastpath.iter_tables(source))
+        self.assertIsInstance(raw_tables[0], fastpath.FastTable)
+        # tables the tokenizer does not handle are parsed, with nested tables
+        self.assertEqual(len(raw_tables), 3)
+        self.assertNotIsInstance(raw_tables[1], fastpath.FastTable)
+
+        expected = _read_page_tables(page, 'en')
+        tables = _read_page_tables(page, 'en', fast=True)
+        self.assertEqual(tables[0].head, ['Rank', 'City', '2018Estimate'])
+        self.assertEqual(tables[0].rows[1]['City'].value, 'Rio city')
+        for table, other in zip(tables, expected):
+            self.assertEqual(table.head, other.head)
+            self.assertEqual(table.json(), other.json())
+            self.assertEqual([str(r.raw) for r in table.rows], [str(r.raw) for r in other.rows])
+            self.assertEqual([[str(f.raw) for f in cells] for cells in table.grid],
+                             [[str(f.raw) for f in cells] for cells in other.grid])
+
+        for source in ("{|\n! a !! b\n|-\n| ''x'''y || z\n|}",
+                       "{|\n! a !! b\n|-\n| [http://example.org x] || z\n|}",
+                       "{|\n! a !! b\n|-\n| <ref>x</ref> || z\n|}",
+                       "{|\n! a !! b\n|-\n| x | y | z\n|}"):
+            self.assertIsNone(fastpath.read_table(source))
+
+    def test_set_head(self):
+        source = """
+{| class="wikitable"
+! A !! B
+|-
+| rowspan="2" | a1 || b1
+|-
+| b2 || extra
+|}
+"""
+        table = self._load(source)
+        reader, fields = table._reader, table.rows[0]['A']
+        table.head = ['x', 'y', 'z']
+        self.assertIs(table._reader, reader)
+        self.assertIs(table.rows[0]['x'], fields)
+        self.assertEqual(json.loads(table.json()), [
+            {'x': 'a1', 'y': 'b1'},
+            {'x': 'a1', 'y': 'b2', 'z': 'extra'},
+        ])
+
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        table = WikiTable("Test Table", node, head=['x', 'y'])
+        self.assertEqual(json.loads(table.json()), [
+            {'x': 'a1', 'y': 'b1'},
+            {'x': 'a1', 'y': 'b2'},
+        ])
+        self.assertEqual(table.options.head, ['x', 'y'])
+        self.assertRaises(TypeError, WikiTable, "Test Table", node, header=['x', 'y'])
+
+        # rehydrated and selected tables are relabeled without re-reading cells
+        table = self._load(source)
+        loaded = WikiTable.load(pickle.loads(pickle.dumps(table.dump())))
+        selected = WikiTable("Test Table", mwp.parse(source).filter_tags(matches=ftag('table'))[0],
+                             keep_raw=False, columns=['B'], where={'A': 'a1'})
+        with mock.patch('wikitables.table._parse_table', side_effect=AssertionError), \
+                mock.patch('wikitables.readers.FieldReader.parse', side_effect=AssertionError):
+            loaded.head = ['x', 'y']
+            selected.head = ['y']
+        self.assertEqual(json.loads(loaded.json()), [
+            {'x': 'a1', 'y': 'b1'},
+            {'x': 'a1', 'y': 'b2'},
+        ])
+        self.assertEqual(str(loaded.rows[1]['y'].raw), '| b2 ')
+        self.assertEqual(json.loads(selected.json()), [{'y': 'b1'}, {'y': 'b2'}])
+        self.assertEqual(selected.options.where, {'A': 'a1'})
+
+    def test_compact_rows(self):
+        source = """
+{| class="wikitable"
+! A !! B !! C
+|-
+| align="right" | 1 || align="right" | 2 || x
+|-
+| rowspan="2" | a || b
+|-
+| c || d
+|}
+"""
+        expected = self._load(source)
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        table = WikiTable("Test Table", node, compact=True, keep_raw=False)
+        self.assertEqual(table.json(), expected.json())
+        self.assertEqual({k: f.value for k, f in table.rows[1].items()}, {'A': 'a', 'B': 'b'})
+        self.assertEqual(len(table.rows[1]), 2)
+        self.assertIs(table.rows[0]['A'].attrs, table.rows[0]['B'].attrs)
+        self.assertIs(table.rows[0]._index, table.rows[2]._index)
+        self.assertIsNone(table.rows[0].raw)
+        self.assertIsNone(table.rows[0]['A'].raw)
+        self.assertIsNone(table._node)
+
+        table.head = ['x', 'y', 'z']
+        self.assertEqual(table.rows[2]['y'].value, 'c')
+
+    def test_cell_memo(self):
+        source = """
+{| class="wikitable"
+! Name !! Country !! Region
+|-
+| a || {{ITA}} || [[Lazio]]
+|-
+| b || {{ITA}} || [[Lazio]]
+|-
+| c ||  {{ITA}} || align="right" | [[Lazio]]
+|-
+| d || {{change|1|2}} || {{change|1|2}}
+|}
+"""
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        expected = WikiTable("Test Table", node)
+        memo = CellMemo()
+        table = WikiTable("Test Table", node, memo=memo)
+        self.assertEqual(table.json(), expected.json())
+        self.assertEqual((memo.hits, memo.misses), (3, 9))
+        self.assertIsNot(table.rows[0]['Country'], table.rows[1]['Country'])
+        self.assertEqual(str(table.rows[1]['Country'].raw), '|| {{ITA}} ')
+        self.assertEqual(table.rows[2]['Region'].attrs, {'align': 'right'})
+
+        table = WikiTable("Test Table", node, memo=memo, compact=True, keep_raw=False)
+        self.assertEqual(table.json(), expected.json())
+        self.assertEqual(memo.hits, 13)
+        self.assertIs(table.rows[0]['Country'], table.rows[1]['Country'])
+
+        memo = CellMemo(maxsize=1)
+        WikiTable("Test Table", node, memo=memo)
+        self.assertEqual(len(memo), 1)
+        self.assertEqual(memo.hit_rate, 0.0)
+
+    def test_projection(self):
+        source = """
+{| class="wikitable"
+! Country !! City !! Rank !! Population !! Change
+|-
+| {{ITA}} || [[Rome]] || {{sort|1|1st}} || 2,856,133 || {{change|10|20}}
+|-
+| {{FRA}} || [[Paris]] || {{sort|2|2nd}} || 2,165,423 || {{change|10|20}}
+|-
+|rowspan="2"| {{ITA}} ||colspan="2"| Milan || 1,378,689
+|-
+| Turin || {{sort|4|4th}} || {{nts|875698}}
+|}
+"""
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        stats = ImportStats()
+        table = WikiTable("Test Table", node, stats=stats,
+                          columns=['City', 'Population'], where={'Country': 'Italy'})
+        self.assertEqual(table.head, ['City', 'Population'])
+        self.assertEqual([r.name for r in table.rows],
+                         ['Test Table[0]', 'Test Table[2]', 'Test Table[3]'])
+        self.assertEqual([dict((k, f.value) for k, f in r.items()) for r in table.rows], [
+            {'City': 'Rome', 'Population': 2856133},
+            {'City': 'Milan', 'Population': 1378689},
+            {'City': 'Turin', 'Population': 875698},
+        ])
+        # change fields are placed, and sort is not read for an unselected column
+        self.assertEqual(stats.templates, {'ITA': 2, 'FRA': 1, 'change': 2, 'nts': 1})
+        self.assertEqual(list(table.to_columns()), ['City', 'Population'])
+
+        # selected columns are relabeled, along with where keys
+        for keep_raw in (True, False):
+            table = WikiTable("Test Table", node, keep_raw=keep_raw, columns=['Country', 'City'],
+                              where={'Country': 'Italy'})
+            table.head = ['Nation', 'Town']
+            self.assertEqual(table.head, ['Nation', 'Town'])
+            self.assertEqual(table.options.where, {'Nation': 'Italy'})
+            self.assertEqual([r['Town'].value for r in table.rows], ['Rome', 'Milan', 'Turin'])
+            self.assertNotIn('Rank', table.rows[0])
+        with self.assertRaises(ValueError):
+            table.head = ['Nation']
+
+        table = WikiTable("Test Table", node, compact=True, keep_raw=False,
+                          columns=['City'], where={'Population': lambda v: v > 2000000})
+        self.assertEqual([r['City'].value for r in table.rows], ['Rome', 'Paris'])
+        self.assertNotIn('Country', table.rows[0])
+
+        # predicates not applying to text or empty values do not match
+        source = "{|\n! City !! Population\n|-\n| a || 150,000\n|-\n| b || n/a\n" \
+            "|-\n| c ||\n|-\n| d || 200000\n|}"
+        mixed = WikiTable("Test Table", mwp.parse(source).filter_tags(matches=ftag('table'))[0],
+                          where={'Population': lambda v: v > 100000})
+        self.assertEqual([r['City'].value for r in mixed.rows], ['a', 'd'])
+        mixed = WikiTable("Test Table", mwp.parse(source).filter_tags(matches=ftag('table'))[0],
+                          where={'Population': lambda v: v.startswith('n')})
+        self.assertEqual([r['City'].value for r in mixed.rows], ['b'])
+        mixed = WikiTable("Test Table", mwp.parse(source).filter_tags(matches=ftag('table'))[0],
+                          where={'Population': lambda v: int(v) > 0})
+        self.assertEqual([r['City'].value for r in mixed.rows], ['a', 'd'])
+
+        loaded = WikiTable.load(pickle.loads(pickle.dumps(table.dump())))
+        self.assertEqual(loaded.head, ['City'])
+        self.assertEqual(str(loaded.rows[1]['City'].raw), '|| [[Paris]] ')
+
+    def test_serialize(self):
+        source = """
+{| class="wikitable"
+! Name !! Population !! Area
+|-
+| Zürich || 1,234 || 87.88
+|-
+| Genève || 203856 ||
+|}
+"""
+        table = self._load(source)
+        expected = json.dumps(table.rows, cls=TableJSONEncoder)
+        self.assertEqual(table.json(), expected)
+        self.assertEqual(table.rows[0].json(), json.dumps(table.rows[0], cls=TableJSONEncoder))
+
+        buf = io.StringIO()
+        table.dump_json(buf)
+        self.assertEqual(buf.getvalue(), expected)
+
+        other = self._load(source)
+        other.name = 'Other'
+        buf = io.StringIO()
+        serialize.dump_tables([table, other], buf)
+        tables_dict = {'Test Table': table.rows, 'Other': other.rows}
+        self.assertEqual(buf.getvalue(), json.dumps(tables_dict, cls=TableJSONEncoder))
+
+        lines = table.ndjson().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[0]), {
+            'table': 'Test Table',
+            'row': {'Name': 'Zürich', 'Population': 1234, 'Area': 87.88},
+        })
+
+        buf = io.StringIO()
+        serialize.dump_ndjson_tables([table, other], buf, 'Foo')
+        lines = [json.loads(line) for line in buf.getvalue().splitlines()]
+        self.assertEqual([(l['title'], l['table']) for l in lines], [('Foo', 'Test Table'), ('Foo', 'Other')])
+        self.assertEqual(lines[0]['rows'], json.loads(expected))
+
+        if serialize.orjson is not None:
+            self.assertEqual(json.loads(table.json(backend='orjson')), json.loads(expected))
+        with self.assertRaises(ValueError):
+            table.json(backend='unknown')
+
+    def test_serialize_large_int(self):
+        table = self._load("{|\n! Name !! Id\n|-\n| a || 123456789012345678901234\n|}")
+        self.assertEqual(table.rows[0]['Id'].value, 123456789012345678901234)
+        row = {'Name': 'a', 'Id': 123456789012345678901234}
+        self.assertEqual(json.loads(table.ndjson()), {'table': 'Test Table', 'row': row})
+
+        buf = io.StringIO()
+        serialize.dump_ndjson_tables([table], buf, 'Foo')
+        self.assertEqual(json.loads(buf.getvalue())['rows'], [row])
+        if serialize.orjson is not None:
+            self.assertEqual(json.loads(table.json(backend='orjson')), [row])
+
+    def test_import_stats(self):
+        source = """
+{| class="wikitable"
+! Name !! Country !! Value
+|-
+| a || {{flag|Italy}} || 1
+|-
+| b || {{flag|France}}
+|-
+| c || {{ITA}} || 3 || 4
+|}
+"""
+        stats = ImportStats()
+        page = {'title': 'Foo', 'revisions': [{'*': source}]}
+        tables = _read_page_tables(page, 'en', stats=stats)
+        tables[0].head = ['x', 'y', 'z']
+        self.assertEqual((stats.tables, stats.rows, stats.cells), (1, 3, 9))
+        self.assertEqual((stats.missing_fields, stats.dropped_fields), (1, 1))
+        self.assertEqual(stats.templates, {'flag': 2, 'ITA': 1})
+        self.assertTrue(all(stats.times[s] > 0 for s in ('parse', 'header', 'rows', 'templates')))
+        self.assertIn('templates: flag=2, ITA=1', stats.report())
+
+    def test_stream_rows(self):
+        source = """
+{| class="wikitable"
+! Region !! City
+|-
+| rowspan="2" | Lazio || Rome
+|-
+| Latina
+|-
+| Lombardy || Milan
+|}
+"""
+        expected = json.loads(self._load(source).json())
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        table = WikiTable("Test Table", node, stream=True)
+        rows = table.iter_rows()
+        first = next(rows)
+        streamed = [first] + list(table.iter_rows())
+        self.assertEqual(json.loads(json.dumps(streamed, cls=TableJSONEncoder)), expected)
+        self.assertEqual(expected[1], {'Region': 'Lazio', 'City': 'Latina'})
+
+        # row nodes are released once read, while the article is streamed
+        page = {'title': 'Foo', 'revisions': [{'*': source + source}]}
+        tables = _stream_page_tables(page, 'en', keep_raw=False)
+        table = next(tables)
+        rows = table.iter_rows()
+        refs = [weakref.ref(r.node) for r in table._tr_nodes]
+        next(rows)
+        gc.collect()
+        self.assertEqual([ref() is None for ref in refs], [True, False, False])
+        list(rows)
+        gc.collect()
+        self.assertTrue(all(ref() is None for ref in refs))
+        self.assertEqual(len(list(next(tables).iter_rows())), 3)
+
+    def test_parallel_import(self):
+        source = """
+Intro
+{| class="wikitable"
+! Name !! Value
+|-
+| a || 1
+|-
+| b ||
+{|
+| nested
+|}
+|}
+Prose
+{|
+! Other
+|-
+| c
+|}
+"""
+        pages = [
+            ('Foo', {'title': 'Foo', 'revisions': [{'*': source}]}),
+            ('Missing', ArticleNotFound('no matching articles returned')),
+            ('Bar', {'title': 'Bar', 'revisions': [{'*': source}]}),
+        ]
+        expected = _read_page_tables(pages[0][1], 'en')
+        importer = ParallelImporter(workers=2, split_size=10, max_pending=1)
+        results = list(importer.import_pages(pages))
+
+        self.assertEqual([title for title, _ in results], ['Foo', 'Missing', 'Bar'])
+        self.assertIsInstance(results[1][1], ArticleNotFound)
+        tables = results[0][1]
+        self.assertEqual([t.name for t in tables], [t.name for t in expected])
+        self.assertEqual([t.json() for t in tables], [t.json() for t in expected])
+        self.assertEqual([t.name for t in results[2][1]], ['Bar[0]', 'Bar[1]', 'Bar[2]'])
+
+        # errors and stats are handled as without workers
+        error = requests.exceptions.ConnectionError('failed')
+        pages = [
+            ('Foo', {'title': 'Foo', 'revisions': [{'*': source}]}),
+            ('Failed', error),
+            # bytes bodies fail to parse in the worker
+            ('Bad', {'title': 'Bad', 'revisions': [{'*': source.encode('utf-8')}]}),
+        ]
+        stats = ImportStats()
+        importer = ParallelImporter(workers=2)
+        results = list(importer.import_pages(pages, raise_errors=False, stats=stats))
+        self.assertEqual([title for title, _ in results], ['Foo', 'Failed', 'Bad'])
+        self.assertIs(results[1][1], error)
+        self.assertIsInstance(results[2][1], TypeError)
+        self.assertEqual(stats.tables, len(expected))
+        self.assertEqual(stats.rows, sum(len(t.rows) for t in expected))
+        self.assertGreater(stats.times['parse'], 0)
+        self.assertRaises(TypeError, list, importer.import_pages(pages[2:]))
+
     def test_flag_template(self):
         source = """
 {| class="wikitable"
@@ -163,6 +827,58 @@ class TestWikiTables(unittest.TestCase):
         table = self._load(source, 'de')
         self._compare(table, expected)
 
+    def test_country_lookups(self):
+        import builtins
+        self._load("{|\n! Nationality\n|-\n| {{AUT}}\n|}", 'de')
+        self.assertFalse(hasattr(builtins, '_'))
+        self.assertIs(get_translation('de'), get_translation('de'))
+        self.assertEqual(get_translation('de').gettext('Austria'), 'Österreich')
+
+    def test_template_readers(self):
+        source = """
+{| class="wikitable"
+! Name !! Length !! Opened !! Rank !! Note
+|-
+| {{Sort|Rome|City of Rome}} || {{convert|12.5|km|mi}} || {{dts|1871|Jul|1}} || {{nts|3}} || {{abbr|N|North}}
+|-
+| {{ITA}} || {{cvt|10|to|20|km}} || {{dts|1871}} || {{nts|12}} || {{citation needed|date=May 2020}}
+|}
+"""
+        self._compare(self._load(source), [
+            {'Name': 'City of Rome', 'Length': '12.5 km', 'Opened': '1871-07-01',
+             'Rank': 3, 'Note': 'N North'},
+            {'Name': 'Italy', 'Length': '10 to 20 km', 'Opened': 1871, 'Rank': 12, 'Note': ''},
+        ])
+
+        register_template_reader('Abbr', lambda node, translate_fn: [str(node.get(1))])
+        self.addCleanup(templates._readers.pop, 'abbr')
+        self.assertEqual(self._load(source).rows[0]['Note'].value, 'N')
+
+    def test_type_inference(self):
+        infer = TypeInferer('en')
+        self.assertEqual(infer('2,856,133'), 2856133)
+        self.assertEqual(infer('\u22125.5'), -5.5)
+        self.assertEqual(infer('1&nbsp;234'), 1234)
+        self.assertEqual(infer('12 34'), '12 34')
+        infer = TypeInferer('de')
+        self.assertEqual(infer('1.234,5'), 1234.5)
+        self.assertEqual(infer('1\u2009234'), 1234)
+        self.assertEqual(infer('3.5'), 3.5)
+        self.assertEqual(infer('1.2.3'), '1.2.3')
+
+        source = "{|\n! Name !! Value\n|-\n| a || 1,5\n|-\n| 7 || 2\n|}"
+        table = self._load(source, 'de')
+        self.assertEqual([r['Value'].value for r in table.rows], [1.5, 2])
+
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        table = WikiTable("Test Table", node, 'de', sample=1)
+        self.assertEqual([r['Name'].value for r in table.rows], ['a', '7'])
+        self.assertEqual([r['Value'].value for r in table.rows], [1.5, 2])
+
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        table = WikiTable("Test Table", node, infer=str)
+        self.assertEqual([r['Value'].value for r in table.rows], ['1,5', '2'])
+
     def test_empty_fields(self):
         source = """
 {| class="wikitable sortable" border="1" style="font-size:85%;"
@@ -251,6 +967,673 @@ class TestWikiTables(unittest.TestCase):
         table = self._load(source)
         self._compare(table, expected)
 
+    def test_to_columns(self):
+        source = """
+{| class="wikitable"
+! Name !! Count !! Ratio !! Mixed
+|-
+| a || 1,000 || 1 || x
+|-
+| b || || 2.5 || 3
+|-
+| c || 3
+|}
+"""
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        lazy_table = WikiTable("Test Table", node, lazy=True)
+        columns = lazy_table.to_columns()
+        self.assertIsNone(lazy_table._rows)
+
+        self.assertEqual([c.dtype for c in columns.values()],
+                         ['string', 'int64', 'float64', 'string'])
+        self.assertEqual(columns['Count'].to_list(), [1000, None, 3])
+        self.assertEqual(columns['Ratio'].to_list(), [1.0, 2.5, None])
+        self.assertEqual(columns['Mixed'].to_list(), ['x', '3', None])
+        # eager tables build columns from their rows, without re-reading cells
+        stats = ImportStats()
+        counted = WikiTable("Test Table", node, stats=stats)
+        counts = (stats.rows, stats.cells)
+        with mock.patch('wikitables.readers.FieldReader.parse', side_effect=AssertionError):
+            self.assertEqual(
+                [c.to_list() for c in counted.to_columns().values()],
+                [c.to_list() for c in columns.values()])
+        self.assertEqual((stats.rows, stats.cells), counts)
+        # streamed tables read values straight into columns
+        streamed = WikiTable("Test Table", node, stream=True)
+        with mock.patch('wikitables.readers.Row', side_effect=AssertionError):
+            self.assertEqual(
+                [c.to_list() for c in streamed.to_columns().values()],
+                [c.to_list() for c in columns.values()])
+        self.assertEqual(list(streamed.iter_rows()), [])
+
+        # streamed tables release their row nodes
+        node = mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+        selected = WikiTable("Test Table", node, columns=['Name', 'Ratio'],
+                             where={'Count': 3}).to_columns()
+        self.assertEqual([(k, c.to_list()) for k, c in selected.items()],
+                         [('Name', ['c']), ('Ratio', [None])])
+
+    @unittest.skipIf(pd is None or pa is None, 'pandas and pyarrow not installed')
+    def test_to_pandas_arrow(self):
+        source = """
+{| class="wikitable"
+! Name !! Count
+|-
+| a || 1
+|-
+| b ||
+|}
+"""
+        table = self._load(source)
+        df = table.to_pandas()
+        self.assertEqual(str(df['Count'].dtype), 'Int64')
+        self.assertTrue(df['Count'].isna()[1])
+        arrow = table.to_arrow()
+        self.assertEqual(arrow.column('Count').to_pylist(), [1, None])
+        self.assertEqual(arrow.column('Name').to_pylist(), ['a', 'b'])
+
+
+class TestDump(unittest.TestCase):
+
+    header = ('<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.10/">'
+              '<siteinfo><sitename>Test</sitename></siteinfo>\n')
+    footer = '</mediawiki>\n'
+
+    @staticmethod
+    def _page(pageid, title, text, ns=0):
+        return ('<page><title>%s</title><ns>%d</ns><id>%d</id><revision><id>%d</id>'
+                '<timestamp>2020-01-01T00:00:00Z</timestamp>'
+                '<text xml:space="preserve">%s</text></revision></page>\n'
+                % (title, ns, pageid, pageid * 10, text))
+
+    def _write_dump(self, path):
+        table = '{| class="wikitable"\n! Name !! Value\n|-\n| %s || %d\n|}'
+        pages = [
+            self._page(1, 'Foo', 'Prose\n' + table % ('a', 1)),
+            self._page(2, 'No Tables', 'Only prose'),
+            self._page(3, 'Talk:Foo', table % ('b', 2), ns=1),
+            self._page(4, 'Bar', table % ('c', 3)),
+        ]
+        # write each page as an independent bz2 stream, with an index
+        offsets, index = 0, []
+        with open(path, 'wb') as f:
+            for n, chunk in enumerate([self.header] + pages + [self.footer]):
+                data = bz2.compress(chunk.encode('utf-8'))
+                if 0 < n <= len(pages):
+                    index.append('%d:%d:page\n' % (offsets, n))
+                f.write(data)
+                offsets += len(data)
+        with bz2.open(path + '.index.bz2', 'wt') as f:
+            f.writelines(index)
+
+    def test_iter_pages(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = tmp + '/dump.xml.bz2'
+            self._write_dump(path)
+            pages = list(dump.iter_pages(path))
+            results = list(dump.import_dump_tables(path))
+
+        self.assertEqual([p['title'] for p in pages], ['Foo', 'Bar'])
+        self.assertEqual(pages[1]['revisions'][0]['revid'], 40)
+        self.assertEqual([title for title, _ in results], ['Foo', 'Bar'])
+        self.assertEqual(json.loads(results[1][1][0].json()), [{'Name': 'c', 'Value': 3}])
+
+    def test_multistream(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = tmp + '/dump.xml.bz2'
+            self._write_dump(path)
+            offsets = dump.read_index(path + '.index.bz2')
+            pages = list(dump.iter_stream_pages(path, offsets[3]))
+            results = list(dump.import_dump_tables(
+                path, index_path=path + '.index.bz2', workers=2))
+
+        self.assertEqual(len(offsets), 4)
+        self.assertEqual([p['title'] for p in pages], ['Bar'])
+        self.assertEqual([title for title, _ in results], ['Foo', 'Bar'])
+        self.assertEqual(results[0][1][0].name, 'Foo[0]')
+        self.assertEqual(json.loads(results[0][1][0].json()), [{'Name': 'a', 'Value': 1}])
+
+
+class FakeResponse():
+
+    def __init__(self, data):
+        self._data = data
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self._data
+
+
+class FakeClient(Client):
+    """ Client serving canned api.php responses in order """
+
+    def __init__(self, responses, lang='en'):
+        super(FakeClient, self).__init__(lang)
+        self.responses = list(responses)
+        self.requests = []
+
+    def request(self, method, url, *args, **kwargs):
+        self.requests.append(kwargs.get('params'))
+        return FakeResponse(self.responses.pop(0))
+
+
+class BatchClient(Client):
+    """ Client answering batched queries for any titles, failing those in fail """
+
+    def __init__(self, fail=()):
+        super(BatchClient, self).__init__()
+        self.fail = set(fail)
+        self.requests = []
+
+    def request(self, method, url, *args, **kwargs):
+        params = kwargs.get('params')
+        self.requests.append(params)
+        titles = params['titles'].split('|')
+        if self.fail.intersection(titles):
+            raise requests.ConnectionError('connection reset')
+        pages = {}
+        for n, title in enumerate(titles):
+            rev = {'revid': 1}
+            if 'content' in params['rvprop']:
+                rev.update({'timestamp': '2020-01-01T00:00:00Z', '*': 'body of ' + title})
+            pages[str(n)] = {'pageid': n, 'ns': 0, 'title': title, 'revisions': [rev]}
+        return FakeResponse({'query': {'pages': pages}})
+
+
+class RedirectClient(BatchClient):
+    """ BatchClient serving 'Bar' as a redirect to 'Baz' """
+
+    def request(self, method, url, *args, **kwargs):
+        params = kwargs.get('params')
+        if params['titles'] != 'Bar':
+            return super(RedirectClient, self).request(method, url, *args, **kwargs)
+        self.requests.append(params)
+        rev = {'revid': 1, 'timestamp': '2020-01-01T00:00:00Z', '*': '#REDIRECT [[Baz]]'}
+        query = {'pages': {'1': {'pageid': 1, 'ns': 0, 'title': 'Bar', 'revisions': [rev]}}}
+        if 'redirects' in params:
+            rev.update({'revid': 2, '*': 'body of Baz'})
+            query = {'redirects': [{'from': 'Bar', 'to': 'Baz'}],
+                     'pages': {'2': {'pageid': 2, 'ns': 0, 'title': 'Baz', 'revisions': [rev]}}}
+        if 'content' not in params['rvprop']:
+            del rev['timestamp'], rev['*']
+        return FakeResponse({'query': query})
+
+
+class TestClient(unittest.TestCase):
+
+    def test_fetch_pages(self):
+        responses = [
+            {
+                'continue': {'rvcontinue': '2|2', 'continue': '||'},
+                'query': {
+                    'normalized': [{'from': 'foo', 'to': 'Foo'}],
+                    'redirects': [{'from': 'Bar', 'to': 'Baz'}],
+                    'pages': {
+                        '1': {'pageid': 1, 'title': 'Foo',
+                              'revisions': [{'*': 'foo body'}]},
+                        '2': {'pageid': 2, 'title': 'Baz'},
+                        '-1': {'title': 'Missing', 'missing': ''},
+                    }
+                }
+            },
+            {
+                'query': {
+                    'pages': {
+                        '2': {'pageid': 2, 'title': 'Baz',
+                              'revisions': [{'*': 'baz body'}]},
+                    }
+                }
+            },
+        ]
+        client = FakeClient(responses)
+        results = list(client.fetch_pages(['foo', 'Missing', 'Bar']))
+
+        self.assertEqual(len(client.requests), 2)
+        self.assertEqual(client.requests[0]['titles'], 'Bar|Missing|foo')
+        self.assertEqual(client.requests[1]['rvcontinue'], '2|2')
+
+        self.assertEqual([t for t, _ in results], ['foo', 'Missing', 'Bar'])
+        self.assertEqual(results[0][1]['revisions'][0]['*'], 'foo body')
+        self.assertIsInstance(results[1][1], ArticleNotFound)
+        self.assertEqual(results[2][1]['revisions'][0]['*'], 'baz body')
+
+    def test_fetch_pages_jobs(self):
+        titles = ['T%d' % n for n in range(120)]
+        client = BatchClient(fail=['T110'])
+        results = list(client.fetch_pages(titles, jobs=3, raise_errors=False))
+
+        self.assertEqual(len(client.requests), 3)
+        self.assertEqual(sorted(t for t, _ in results), sorted(titles))
+        pages = dict(results)
+        self.assertEqual(pages['T5']['revisions'][0]['*'], 'body of T5')
+        self.assertIsInstance(pages['T101'], requests.ConnectionError)
+
+        with self.assertRaises(requests.ConnectionError):
+            list(BatchClient(fail=['T110']).fetch_pages(titles, jobs=3))
+
+    def test_fetch_pages_cached(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = DirectoryCache(path)
+            client = BatchClient()
+            client.cache = cache
+            first = list(client.fetch_pages(['Foo', 'Bar']))
+            second = list(client.fetch_pages(['Foo', 'Bar', 'Baz']))
+
+        self.assertEqual([r['rvprop'] for r in client.requests],
+                         ['ids|timestamp|content', 'ids', 'ids|timestamp|content'])
+        self.assertEqual(client.requests[1]['titles'], 'Bar|Foo')
+        self.assertEqual(client.requests[2]['titles'], 'Baz')
+        self.assertEqual(second[:2], first)
+        self.assertEqual(cache.stats['hits'], 2)
+        self.assertEqual(cache.stats['misses'], 3)
+
+    def test_fetch_redirect_cached(self):
+        # single and batched fetches of a redirect cache the same page
+        with tempfile.TemporaryDirectory() as path:
+            client = RedirectClient()
+            client.cache = DirectoryCache(path)
+            single = client.fetch_page('Bar')
+            batched = dict(client.fetch_pages(['Bar']))['Bar']
+            again = client.fetch_page('Bar')
+
+        for page in (single, batched, again):
+            self.assertEqual(page['title'], 'Baz')
+            self.assertEqual(page['revisions'][0]['*'], 'body of Baz')
+        self.assertEqual(client.cache.stats['hits'], 2)
+        self.assertEqual(client.cache.stats['stale'], 0)
+
+    def _check_cache(self, cache):
+        def page(revid, body=None):
+            rev = {'revid': revid}
+            if body is not None:
+                rev.update({'timestamp': '2020-01-01T00:00:00Z', '*': body})
+            return {'query': {'pages': {'1': {'pageid': 1, 'ns': 0, 'title': 'Foo',
+                                              'revisions': [rev]}}}}
+
+        responses = [page(1, 'first'), page(1), page(2), page(2, 'second')]
+        client = FakeClient(responses)
+        client.cache = cache
+
+        bodies = [client.fetch_page('Foo')['revisions'][0]['*'] for _ in range(3)]
+        self.assertEqual(bodies, ['first', 'first', 'second'])
+        self.assertEqual([r['rvprop'] for r in client.requests],
+                         ['ids|timestamp|content', 'ids', 'ids', 'ids|timestamp|content'])
+        self.assertEqual(cache.stats['misses'], 1)
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['stale'], 1)
+        self.assertEqual(cache.stats['revalidations'], 2)
+
+    def test_request_stats(self):
+        body = json.dumps({'query': {'pages': {'1': {
+            'pageid': 1, 'title': 'Foo', 'revisions': [{'revid': 1, '*': 'body'}]}}}})
+
+        class Adapter(HTTPAdapter):
+            def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+                resp = requests.Response()
+                resp.status_code = 200
+                resp._content = body.encode('utf-8')
+                resp.request = request
+                return resp
+
+        stats = ImportStats()
+        client = Client(stats=stats)
+        client.mount('https://', Adapter())
+        self.assertEqual(client.fetch_page('Foo')['title'], 'Foo')
+        self.assertEqual((stats.requests, stats.bytes_fetched), (1, len(body)))
+
+    def test_fetch_sections(self):
+        # an article as most end: citations inline, a short reference list
+        # and link sections
+        table = '{| class="wikitable"\n! Name !! Value\n|-\n| %s || 1\n|}\n'
+        cite = '<ref>{{cite web|url=http://example.org/%d|title=Census %d}}</ref>'
+        texts = [
+            'Foo is a region.' + cite % (0, 0) + '\n' + table % 'a',
+            '== Cities ==\n' + ''.join(cite % (n, n) for n in range(20)) + '\n' + table % 'b',
+            '=== North ===\n' + table % 'c',
+            '== Notes ==\n' + table % 'n',
+            '== <span>Towns</span> ==\n' + table % 'd',
+            '== See also ==\n* [[Bar]]\n* [[List of regions]]\n',
+            '== References ==\n{{reflist}}\n',
+            '=== Sources ===\n' + '* {{cite book|title=Atlas|year=2001}}\n' * 20,
+            '== External links ==\n' + '* [http://example.org Official site]\n' * 10 +
+            '{{Regions navbox}}\n{| class="navbox"\n| [[Bar]]\n|}\n',
+        ]
+        outline = [
+            {'index': '1', 'level': '2', 'line': 'Cities'},
+            {'index': '2', 'level': '3', 'line': 'North'},
+            {'index': 'T-1', 'level': '3', 'line': 'Transcluded'},
+            {'index': '3', 'level': '2', 'line': 'Notes'},
+            {'index': '4', 'level': '2', 'line': '<span>Towns</span>'},
+            {'index': '5', 'level': '2', 'line': 'See also'},
+            {'index': '6', 'level': '2', 'line': 'References'},
+            {'index': '7', 'level': '3', 'line': 'Sources'},
+            {'index': '8', 'level': '2', 'line': 'External links'},
+        ]
+        # end of each section with its subsections
+        ends = {0: 1, 1: 3, 3: 4, 4: 5, 5: 6, 6: 8, 8: 9}
+        params = []
+
+        class Adapter(HTTPAdapter):
+            # stub api.php, serving the outline and sections of a single page
+            def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+                query = dict(parse_qsl(urlparse(request.url).query))
+                params.append(query)
+                if query['action'] == 'parse':
+                    data = {'parse': {'title': 'Foo', 'pageid': 1, 'revid': 7,
+                                      'sections': outline}}
+                else:
+                    idx = int(query.get('rvsection', 0))
+                    end = ends[idx] if 'rvsection' in query else len(texts)
+                    body = '\n'.join(texts[idx:end])
+                    data = {'query': {'pages': {'1': {'pageid': 1, 'title': 'Foo', 'revisions': [
+                        {'revid': 7, 'timestamp': '2020-01-01T00:00:00Z', '*': body}]}}}}
+                resp = requests.Response()
+                resp.status_code = 200
+                resp._content = json.dumps(data).encode('utf-8')
+                resp.request = request
+                return resp
+
+        def fetch(stats, **kwargs):
+            del params[:]
+            client = Client(stats=stats)
+            client.mount('https://', Adapter())
+            return client.fetch_page('Foo', **kwargs)
+
+        full, partial = ImportStats(), ImportStats()
+        expected = _read_page_tables(fetch(full), 'en')
+        page = fetch(partial, sections=True)
+
+        # only the trailing See also, References and External links sections
+        # are skipped; Notes is read, with its table
+        self.assertEqual(sorted(p.get('rvsection') for p in params[1:]), ['0', '1', '3', '4'])
+        self.assertTrue(all(p['revids'] == '7' for p in params[1:]))
+        self.assertEqual(page['revisions'][0]['revid'], 7)
+        self.assertLess(partial.bytes_fetched, full.bytes_fetched)
+
+        # fetched tables keep the names of a full-page import
+        tables = _read_page_tables(page, 'en')
+        self.assertEqual([t.name for t in expected], ['Foo[%d]' % n for n in range(6)])
+        self.assertEqual([t.name for t in tables], ['Foo[%d]' % n for n in range(5)])
+        self.assertEqual([t.json() for t in tables], [t.json() for t in expected[:5]])
+
+        # an article not ending with skipped sections is fetched whole
+        del outline[5:], texts[5:]
+        expected = _read_page_tables(fetch(ImportStats()), 'en')
+        page = fetch(ImportStats(), sections=True)
+        self.assertEqual(len(params), 2)
+        self.assertNotIn('rvsection', params[1])
+        self.assertEqual([t.json() for t in _read_page_tables(page, 'en')],
+                         [t.json() for t in expected])
+
+    def test_directory_cache(self):
+        with tempfile.TemporaryDirectory() as path:
+            self._check_cache(DirectoryCache(path))
+
+    def test_sqlite_cache(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = SQLiteCache(path + '/cache.db')
+            self._check_cache(cache)
+            cache.close()
+
+    def test_cache_eviction(self):
+        with tempfile.TemporaryDirectory() as path:
+            cache = SQLiteCache(path + '/cache.db', max_size=10)
+            cache.set('a', b'123456')
+            cache.set('b', b'123456')
+            self.assertIsNone(cache.get('a'))
+            self.assertEqual(cache.get('b'), b'123456')
+            self.assertEqual(cache.stats['evictions'], 1)
+            cache.close()
+
+    def test_cache_eviction_batch(self):
+        with tempfile.TemporaryDirectory() as path:
+            caches = [
+                SQLiteCache(path + '/cache.db'),
+                DirectoryCache(path + '/cache'),
+            ]
+            for cache in caches:
+                # room for ten entries, as measured by the backend
+                cache.set('k0', b'x' * 10)
+                cache.max_size = cache._size() * 10
+                for i in range(10):
+                    cache.set('k%d' % i, b'x' * 10)
+                self.assertEqual(cache.stats['evictions'], 0)
+                # eviction only runs over max_size, and frees room for more
+                cache.set('k10', b'x' * 10)
+                self.assertIsNone(cache.get('k0'))
+                self.assertIsNone(cache.get('k1'))
+                self.assertIsNotNone(cache.get('k2'))
+                evictions = cache.stats['evictions']
+                cache.set('k11', b'x' * 10)
+                self.assertEqual(cache.stats['evictions'], evictions)
+                # replacing and deleting entries updates the tracked size
+                cache.set('k11', b'x')
+                cache.delete('k10')
+                self.assertEqual(cache._total, cache._size())
+            caches[0].close()
+
+
+class ApiAdapter(HTTPAdapter):
+    """ Stub api.php, serving a single table page for any title but Missing """
+
+    source = '{| class="wikitable"\n! Name !! Value\n|-\n| a || 1\n|-\n| b || 2\n|}\n'
+    requests = []
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        query = dict(parse_qsl(urlparse(request.url).query))
+        self.requests.append(query)
+        pages = {}
+        for n, title in enumerate(query['titles'].split('|')):
+            if title == 'Missing':
+                pages[str(-n - 1)] = {'title': title, 'missing': ''}
+                continue
+            rev = {'revid': 1}
+            if 'content' in query['rvprop']:
+                rev.update({'timestamp': '2020-01-01T00:00:00Z',
+                            '*': self.source + self.source.replace('a ||', title + ' ||')})
+            pages[str(n + 1)] = {'pageid': n + 1, 'ns': 0, 'title': title, 'revisions': [rev]}
+        resp = requests.Response()
+        resp.status_code = 200
+        resp._content = json.dumps({'query': {'pages': pages}}).encode('utf-8')
+        resp.request = request
+        return resp
+
+
+class TestCLI(unittest.TestCase):
+
+    def setUp(self):
+        ApiAdapter.requests = []
+
+    def _run(self, *argv, stdin=''):
+        # run the cli, returning its exit status, stdout and stderr
+        stdout, stderr = io.StringIO(), io.StringIO()
+        with mock.patch('wikitables.client.HTTPAdapter', ApiAdapter), \
+                mock.patch('logging.basicConfig'), \
+                mock.patch('sys.argv', ['wikitables'] + list(argv)), \
+                mock.patch('sys.stdin', io.StringIO(stdin)), \
+                mock.patch('sys.stdout', stdout), mock.patch('sys.stderr', stderr):
+            try:
+                cli.main()
+                code = 0
+            except SystemExit as e:
+                code = e.code
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def _tables(self, title):
+        page = {'title': title, 'revisions': [{'*': ApiAdapter.source + ApiAdapter.source.replace(
+            'a ||', title + ' ||')}]}
+        return _read_page_tables(page, 'en')
+
+    def test_single_title(self):
+        code, out, _ = self._run('Foo')
+        self.assertEqual(code, 0)
+        # a single title keeps the output of a json object of all tables
+        expected = json.dumps({t.name: t.rows for t in self._tables('Foo')}, cls=TableJSONEncoder)
+        self.assertEqual(out, expected + '\n')
+        self.assertEqual(len(ApiAdapter.requests), 1)
+
+        code, out, _ = self._run('--ndjson', 'Foo')
+        self.assertEqual(code, 0)
+        lines = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[0], {'table': 'Foo[0]', 'row': {'Name': 'a', 'Value': 1}})
+        self.assertEqual(lines[2], {'table': 'Foo[1]', 'row': {'Name': 'Foo', 'Value': 1}})
+
+    def test_many_titles(self):
+        code, out, _ = self._run('--jobs', '2', 'Foo', 'Bar')
+        self.assertEqual(code, 0)
+        # one line per table, from a single batched request
+        lines = [json.loads(line) for line in out.splitlines()]
+        self.assertEqual([(l['title'], l['table']) for l in lines], [
+            ('Foo', 'Foo[0]'), ('Foo', 'Foo[1]'), ('Bar', 'Bar[0]'), ('Bar', 'Bar[1]')])
+        self.assertEqual(lines[3]['rows'], [{'Name': 'Bar', 'Value': 1}, {'Name': 'b', 'Value': 2}])
+        self.assertEqual(len(ApiAdapter.requests), 1)
+        self.assertEqual(ApiAdapter.requests[0]['titles'], 'Bar|Foo')
+
+        code, out, _ = self._run('--ndjson', 'Foo', 'Bar')
+        self.assertEqual(code, 0)
+        self.assertEqual(len(out.splitlines()), 8)
+
+    def test_titles_from_file(self):
+        code, out, _ = self._run('-f', '-', stdin='Foo\n\nBar\n')
+        self.assertEqual(code, 0)
+        self.assertEqual([json.loads(l)['title'] for l in out.splitlines()],
+                         ['Foo', 'Foo', 'Bar', 'Bar'])
+
+        with tempfile.TemporaryDirectory() as path:
+            with open(path + '/titles.txt', 'w', encoding='utf-8') as f:
+                f.write('Foo\n')
+            code, out, _ = self._run('--file', path + '/titles.txt')
+        # titles from a file are always written as ndjson
+        self.assertEqual(code, 0)
+        self.assertEqual([json.loads(l)['table'] for l in out.splitlines()], ['Foo[0]', 'Foo[1]'])
+
+        # titles are read from stdin when none are given
+        code, out, _ = self._run(stdin='Foo\n')
+        self.assertEqual(code, 0)
+        self.assertEqual(list(json.loads(out)), ['Foo[0]', 'Foo[1]'])
+
+        code, out, _ = self._run()
+        self.assertEqual(code, 1)
+        self.assertIn('usage', out)
+
+    def test_continue_on_error(self):
+        code, out, _ = self._run('Missing', 'Foo')
+        self.assertEqual(code, 1)
+        self.assertEqual(out, '')
+
+        code, out, _ = self._run('--continue-on-error', 'Missing', 'Foo')
+        self.assertEqual(code, 1)
+        self.assertEqual([json.loads(l)['title'] for l in out.splitlines()], ['Foo', 'Foo'])
+
+    def test_cache_dir(self):
+        with tempfile.TemporaryDirectory() as path:
+            first = self._run('--cache-dir', path, 'Foo', 'Bar')
+            second = self._run('--cache-dir', path, 'Foo', 'Bar')
+        self.assertEqual(second, first)
+        # cached pages are revalidated by revision id only
+        self.assertEqual([r['rvprop'] for r in ApiAdapter.requests],
+                         ['ids|timestamp|content', 'ids'])
+
+    def test_stats(self):
+        code, out, err = self._run('--stats', 'Foo')
+        self.assertEqual(code, 0)
+        self.assertTrue(out)
+        self.assertIn('requests: 1', err)
+        self.assertIn('tables: 2  rows: 4  cells: 8', err)
+        self.assertIn('serialize', err)
+
+
+@unittest.skipIf(web is None, 'aiohttp not installed')
+class TestAsyncClient(unittest.TestCase):
+
+    source = """
+{| class="wikitable"
+! Name !! Value
+|-
+| a || 1
+|}
+"""
+
+    async def _serve(self, handler):
+        app = web.Application()
+        app.router.add_get('/w/api.php', handler)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        return runner, 'http://127.0.0.1:%d/w/api.php' % port
+
+    def test_import_with_retry(self):
+        calls = []
+
+        async def handler(request):
+            calls.append(request.query['titles'])
+            self.assertEqual(request.query['rvprop'], 'ids|timestamp|content')
+            if len(calls) == 1:
+                return web.Response(status=429, headers={'Retry-After': '0'})
+            if len(calls) == 2:
+                # connection errors are retried alike
+                request.transport.close()
+                return web.Response()
+            if request.query['titles'] == 'Missing':
+                pages = {'-1': {'title': 'Missing', 'missing': ''}}
+            else:
+                pages = {'1': {'title': 'Stub', 'revisions': [{
+                    'revid': 5, 'timestamp': '2020-01-01T00:00:00Z', '*': self.source}]}}
+            return web.json_response({'query': {'pages': pages}})
+
+        async def run(table_cache):
+            runner, url = await self._serve(handler)
+            try:
+                async with aio.AsyncClient(max_concurrency=2, rate_limit=100,
+                                           backoff=0) as client:
+                    client.base_url = url
+                    tables = await aio.async_import_tables('Stub', client=client,
+                                                           table_cache=table_cache)
+                    page = await client.fetch_page('Stub')
+                    with self.assertRaises(ArticleNotFound):
+                        await client.fetch_page('Missing')
+            finally:
+                await runner.cleanup()
+            return tables, page
+
+        loop = asyncio.new_event_loop()
+        try:
+            with tempfile.TemporaryDirectory() as path:
+                cache = DirectoryCache(path)
+                tables, page = loop.run_until_complete(run(cache))
+        finally:
+            loop.close()
+        self.assertEqual(calls, ['Stub', 'Stub', 'Stub', 'Stub', 'Missing'])
+        self.assertEqual(page['revisions'][0]['revid'], 5)
+        self.assertEqual(cache.stats['misses'], 1)
+        self.assertEqual(len(tables), 1)
+        self.assertEqual(json.loads(tables[0].json()), [{'Name': 'a', 'Value': 1}])
+
+    def test_host_limiter(self):
+        async def run():
+            slow, fast = aio._HostLimiter(2), aio._HostLimiter(100)
+            start = time.monotonic()
+            waits = [slow.wait(), slow.wait(), slow.wait()]
+            tasks = [asyncio.ensure_future(w) for w in waits]
+            # a host waiting on its rate limit does not delay other hosts
+            await fast.wait()
+            fast_elapsed = time.monotonic() - start
+            await asyncio.gather(*tasks)
+            return fast_elapsed, time.monotonic() - start
+
+        loop = asyncio.new_event_loop()
+        try:
+            fast_elapsed, elapsed = loop.run_until_complete(run())
+        finally:
+            loop.close()
+        self.assertLess(fast_elapsed, 0.25)
+        self.assertGreaterEqual(elapsed, 0.95)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -1,130 +1,148 @@
-import json
+import pickle
 import logging
 
-import mwparserfromhell as mwp
-
-from wikitables.client import Client
-from wikitables.readers import RowReader
+from wikitables.cache import cache_key
+from wikitables.client import Client, ArticleNotFound
+from wikitables import fastpath
+from wikitables.index import TableIndex
+from wikitables.models import Field, Row
+from wikitables.parallel import ParallelImporter
+from wikitables.readers import CellMemo, ReadOptions, RowReader
+from wikitables.scanner import parse_tables, iter_tables
+from wikitables.stats import timed, timed_iter
+from wikitables.table import WikiTable
+from wikitables.templates import register_template_reader
 from wikitables.util import TableJSONEncoder, ftag, ustr
+from wikitables.version import version
 
 
 log = logging.getLogger('wikitables')
 
 
-def import_tables(article, lang='en'):
-    client = Client(lang)
-    page = client.fetch_page(article)
+def import_tables(article, lang='en', *, cache=None,  # pylint: disable=too-many-arguments
+                  table_cache=None, lazy=False, stream=False, stats=None, sections=False,
+                  **kwargs):
+    """
+    Import all tables from a given article. With lazy=True, a TableIndex of
+    unparsed table handles is returned instead, and tables are only parsed
+    once their head or rows are accessed, with the given options; parsed
+    tables are not cached. With stream=True, a generator of
+    tables is returned, whose rows are read via WikiTable.iter_rows().
+    With fast=True, plain wikitables are read by a line-oriented tokenizer
+    rather than the parser, see wikitables.fastpath. With columns and
+    where, only the given columns of matching rows are read, see WikiTable.
+    With sections=True, the reference and link sections ending the article
+    are not fetched, see Client.fetch_page(). Timings and counters are collected
+    into a given wikitables.stats.ImportStats. Additional keyword arguments
+    are passed to WikiTable, see wikitables.readers.ReadOptions
+    """
+    if lazy and table_cache is not None:
+        raise ValueError('table_cache is not supported with lazy=True')
+    client = Client(lang, cache=cache, stats=stats)
+    with timed(stats, 'fetch'):
+        page = client.fetch_page(article, sections=sections)
+    if stats is not None:
+        kwargs['stats'] = stats
+    if lazy:
+        return TableIndex.from_page(page, lang, **kwargs)
+    if stream:
+        return _stream_page_tables(page, lang, **kwargs)
+    return _read_page_tables(page, lang, table_cache, **kwargs)
+
+
+def import_tables_many(titles, lang='en', *, workers=None,  # pylint: disable=too-many-arguments
+                       jobs=None, cache=None, raise_errors=True, stats=None):
+    """
+    Import tables from multiple articles, fetching up to MAX_TITLES articles
+    per request over a single pooled session. Yields a (title, tables) tuple
+    per requested title as each batch arrives, where tables is an
+    ArticleNotFound instance for titles with no matching article. If workers
+    is given, tables are parsed across a pool of that many processes, see
+    wikitables.parallel.ParallelImporter. If jobs is given, up to that many
+    batches are fetched concurrently and yielded as they complete. With
+    raise_errors=False, exceptions fetching or parsing an article are
+    yielded in place of its tables
+    """
+    with Client(lang, pool_size=max(10, jobs or 0), cache=cache, stats=stats) as client:
+        if workers:
+            importer = ParallelImporter(lang, workers=workers)
+            for result in importer.import_titles(titles, client, jobs, raise_errors, stats):
+                yield result
+            return
+
+        pages = client.fetch_pages(titles, jobs=jobs, raise_errors=raise_errors)
+        for title, page in timed_iter(stats, 'fetch', pages):
+            if isinstance(page, Exception):
+                yield title, page
+                continue
+            try:
+                tables = _read_page_tables(page, lang, stats=stats)
+            except Exception as e:  # pylint: disable=broad-except
+                if raise_errors:
+                    raise
+                log.warning('failed to import tables from %s: %s', title, e)
+                yield title, e
+                continue
+            yield title, tables
+
+
+def _read_page_tables(page, lang, table_cache=None, **kwargs):
+    if table_cache is None or not _cacheable(kwargs):
+        # tables read with other options are not cached, keyed on the
+        # revision alone
+        return _parse_page_tables(page, lang, **kwargs)
+
+    # parsed tables are keyed on article revision and wikitables version
+    revid = page['revisions'][0].get('revid')
+    key = cache_key('tables', lang, page['title'], revid, version)
+    cached = table_cache.get(key) if revid is not None else None
+    if cached is not None:
+        log.debug('parsed table cache hit for %s (revid %s)', page['title'], revid)
+        table_cache.incr('hits')
+        return [WikiTable.load(data) for data in pickle.loads(cached)]
+
+    table_cache.incr('misses')
+    tables = _parse_page_tables(page, lang, **kwargs)
+    if revid is not None:
+        data = [table.dump() for table in tables]
+        table_cache.set(key, pickle.dumps(data, pickle.HIGHEST_PROTOCOL))
+    return tables
+
+
+def _cacheable(kwargs):
+    # whether tables read with the given options are those loaded from cache,
+    # read with the default options
+    options = {k: v for k, v in kwargs.items() if k not in _output_neutral}
+    return ReadOptions(**options) == ReadOptions()
+
+
+# options not affecting the parsed tables
+_output_neutral = ('stats', 'memo', 'fast')
+
+
+def _parse_page_tables(page, lang, fast=False, **kwargs):
     body = page['revisions'][0]['*']
 
     ## parse for tables
-    raw_tables = mwp.parse(body).filter_tags(matches=ftag('table'))
+    with timed(kwargs.get('stats'), 'parse'):
+        if fast:
+            raw_tables = list(fastpath.iter_tables(body))
+        else:
+            raw_tables = parse_tables(body)
 
     def _table_gen():
         for idx, table in enumerate(raw_tables):
             name = '%s[%s]' % (page['title'], idx)
-            yield WikiTable(name, table, lang)
+            yield WikiTable(name, table, lang, **kwargs)
 
     return list(_table_gen())
 
 
-class WikiTable():
-    """
-    Parsed Wikipedia table
-    attributes:
-     - name(str): Table name in the format <article_name>[<table_index>]
-     - head(list): List of parsed column names as strings
-     - rows(list): List of <wikitables.Row> objects
-    """
-    def __init__(self, name, raw_table, lang='en'):
-        self.name = ustr(name)
-        self.lang = lang
-        self.rows = []
-        self._head = []
-        self._node = raw_table
-        self._tr_nodes = raw_table.contents.filter_tags(matches=ftag('tr'))
-        self._read_header()
-        self._read_rows()
-
-    def json(self):
-        return json.dumps(self.rows, cls=TableJSONEncoder)
-
-    @property
-    def head(self):
-        return self._head
-
-    @head.setter
-    def head(self, val):
-        if not isinstance(val, list):
-            raise ValueError('table head must be provided as list')
-        self._head = val
-        self._read_rows()
-
-    def __repr__(self):
-        return "<WikiTable '%s'>" % self.name
-
-    def _log(self, value):
-        log.debug('%s: %s', self.name, value)
-
-    def _read_rows(self):
-        reader = RowReader(self.name, self._head, self.lang)
-        self.rows = list(reader.parse(*self._tr_nodes))
-        self._log('parsed %d rows %d cols' % (len(self.rows), len(self._head)))
-
-    def _read_header(self):
-        # read header
-        header_nodes = self._find_header_flat()
-        if not header_nodes:
-            header_nodes = self._find_header_row()
-        if not header_nodes:
-            header_nodes = self._make_default_header()
-
-        for header_node in header_nodes:
-            field_name = header_node.contents.strip_code().strip(' ')
-            self._head.append(ustr(field_name))
-
-    def _find_header_flat(self):
-        """
-        Find header elements in a table, if possible. This case handles
-        situations where '<th>' elements are not within a row('<tr>')
-        """
-        nodes = self._node.contents.filter_tags(matches=ftag('th'), recursive=False)
-        if not nodes:
-            return None
-        self._log('found header outside rows (%d <th> elements)' % len(nodes))
-        return nodes
-
-    def _find_header_row(self):
-        """
-        Evaluate all rows and determine header position, based on
-        greatest number of 'th' tagged elements
-        """
-        th_max = 0
-        header_idx = 0
-        for idx, tr_node in enumerate(self._tr_nodes):
-            th_count = len(tr_node.contents.filter_tags(matches=ftag('th')))
-            if th_count > th_max:
-                th_max = th_count
-                header_idx = idx
-
-        if not th_max:
-            return None
-
-        self._log('found header at row %d (%d <th> elements)' % \
-                    (header_idx, th_max))
-
-        header_row = self._tr_nodes.pop(header_idx)
-        return header_row.contents.filter_tags(matches=ftag('th'))
-
-    def _make_default_header(self):
-        """
-        Return a generic placeholder header based on the tables column count
-        """
-        td_max = 0
-
-        for tr_node in self._tr_nodes:
-            td_count = len(tr_node.contents.filter_tags(matches=ftag('td')))
-            if td_count > td_max:
-                td_max = td_count
-
-        self._log('creating default header (%d columns)' % td_max)
-        return ['column%d' % n for n in range(0, td_max)]
+def _stream_page_tables(page, lang, fast=False, **kwargs):
+    body = page['revisions'][0]['*']
+    raw_tables = fastpath.iter_tables(body) if fast else iter_tables(body)
+    for idx, table in enumerate(raw_tables):
+        name = '%s[%s]' % (page['title'], idx)
+        # the table node is not held while its rows are streamed
+        table = WikiTable(name, table, lang, stream=True, **kwargs)
+        yield table
@@ -0,0 +1,158 @@
+import time
+import asyncio
+import logging
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+from wikitables import _read_page_tables
+from wikitables.client import ArticleNotFound, _page_params
+
+
+log = logging.getLogger(__name__)
+
+# response statuses considered transient and retried with backoff
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class AsyncClient():
+    """
+    Asyncio Mediawiki API client, with the same fetch_page contract as
+    wikitables.Client
+    params:
+     - lang(str): Article language
+     - max_concurrency(int): Maximum number of in-flight requests
+     - rate_limit(float): Maximum requests per second to any single host
+     - retries(int): Number of retries for 429/5xx responses, connection
+       errors and timeouts
+     - backoff(float): Base delay in seconds for exponential backoff
+    """
+    def __init__(self, lang='en', max_concurrency=10, rate_limit=None,
+                 retries=3, backoff=0.5):
+        if aiohttp is None:
+            raise ImportError('aiohttp is required for AsyncClient')
+        self.base_url = 'https://' + lang + '.wikipedia.org/w/api.php'
+        self.retries = retries
+        self.backoff = backoff
+        self.rate_limit = rate_limit
+        self._sem = asyncio.Semaphore(max_concurrency)
+        self._limiters = {}
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def fetch_page(self, title, method='GET'):
+        """ Query for page by title """
+        data = await self.request(method, self.base_url,
+                                  _page_params(title, 'ids|timestamp|content'))
+        pages = data["query"]["pages"]
+        # use key from first result in 'pages' array
+        page_id = list(pages.keys())[0]
+        if page_id == '-1':
+            raise ArticleNotFound('no matching articles returned')
+
+        return pages[page_id]
+
+    async def request(self, method, url, params):
+        """
+        Perform a rate limited request, retrying transient failures,
+        and return the decoded json response
+        """
+        if self._session is None:
+            self._session = aiohttp.ClientSession()
+
+        attempt = 0
+        while True:
+            # requests waiting on the rate limit of a host do not hold a
+            # slot of the semaphore, shared across hosts
+            await self._wait_rate_limit(url)
+            try:
+                async with self._sem:
+                    async with self._session.request(method, url, params=params) as resp:
+                        if resp.status not in RETRY_STATUSES or attempt >= self.retries:
+                            resp.raise_for_status()
+                            return await resp.json(content_type=None)
+                        delay = _retry_after(resp.headers.get('Retry-After'))
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+                if attempt >= self.retries:
+                    raise
+                log.debug('request to %s failed: %s', url, e)
+                delay = None
+
+            if delay is None:
+                delay = self.backoff * (2 ** attempt)
+            attempt += 1
+            log.debug('retrying %s in %.2fs (attempt %d)', url, delay, attempt)
+            await asyncio.sleep(delay)
+
+    async def _wait_rate_limit(self, url):
+        if not self.rate_limit:
+            return
+        host = urlparse(url).netloc
+        if host not in self._limiters:
+            self._limiters[host] = _HostLimiter(self.rate_limit)
+        await self._limiters[host].wait()
+
+
+class _HostLimiter():
+    """ Spaces out requests to a single host at a fixed rate """
+
+    def __init__(self, rate):
+        self.interval = 1.0 / rate
+        self._next = 0.0
+
+    async def wait(self):
+        # the next free slot is reserved before sleeping, without awaiting,
+        # so concurrent waiters are spaced out without holding a lock
+        now = time.monotonic()
+        start = max(self._next, now)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def async_import_tables(article, lang='en', client=None, executor=None,
+                              table_cache=None):
+    """
+    Coroutine importing all tables from a given article. A shared AsyncClient
+    may be provided to bound concurrency across many calls; table parsing is
+    run in the given executor(or the loop default) to avoid blocking the loop.
+    Parsed tables may be cached by article revision in table_cache, as by
+    import_tables()
+    """
+    if client is None:
+        async with AsyncClient(lang) as own_client:
+            page = await own_client.fetch_page(article)
+    else:
+        page = await client.fetch_page(article)
+
+    # within a coroutine, the running loop
+    loop = asyncio.get_event_loop()
+    return await loop.run_in_executor(executor, _read_page_tables, page, lang, table_cache)
+
+
+def _retry_after(value):
+    # parse Retry-After header, given in either seconds or as an HTTP-date
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
@@ -0,0 +1,284 @@
+# pylint: disable=useless-object-inheritance
+# Persistent cache backends
+import os
+import time
+import pickle
+import hashlib
+import sqlite3
+import logging
+import threading
+
+
+log = logging.getLogger('wikitables')
+
+# fraction of max_size evicted down to, so that eviction runs in batches
+# rather than on every set() once the cache is full
+EVICT_RATIO = 0.9
+
+
+class BaseCache(object):
+    """
+    Base key-value cache with TTL and size-based LRU eviction. The total
+    size of stored values is tracked as entries are set and deleted, and
+    least recently used entries are evicted in batches, down to
+    EVICT_RATIO of max_size, once it is exceeded
+    params:
+     - ttl(int): Maximum entry age in seconds, or None to never expire
+     - max_size(int): Maximum total size of stored values in bytes,
+       or None for an unbounded cache
+    attributes:
+     - stats(dict): Cache hit, miss and revalidation counters
+    """
+    def __init__(self, ttl=None, max_size=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'revalidations': 0,
+            'stale': 0,
+            'evictions': 0,
+            'bytes_saved': 0,
+        }
+        self._lock = threading.RLock()
+        self._total = None  # stored bytes, read on first use
+
+    def get(self, key):
+        """ Return the value stored for key, or None if absent or expired """
+        with self._lock:
+            item = self._get(key)
+            if item is None:
+                return None
+            created, value = item
+            if self.ttl is not None and time.time() - created > self.ttl:
+                log.debug('cache entry expired: %s', key)
+                self.delete(key)
+                return None
+            self._touch(key)
+            return value
+
+    def set(self, key, value):
+        """ Store a bytes value for key, evicting entries over max_size """
+        with self._lock:
+            if self.max_size is not None and self._total is None:
+                self._total = self._size()
+            added = self._set(key, value, time.time())
+            if self._total is None:
+                return
+            self._total += added
+            if self._total > self.max_size:
+                target = int(self.max_size * EVICT_RATIO)
+                evicted, self._total = self._evict(self._total, target)
+                self.stats['evictions'] += evicted
+
+    def delete(self, key):
+        with self._lock:
+            removed = self._delete(key)
+            if self._total is not None:
+                self._total -= removed
+
+    def incr(self, stat, n=1):
+        with self._lock:
+            self.stats[stat] += n
+
+    def _get(self, key):
+        raise NotImplementedError
+
+    def _set(self, key, value, created):
+        """ Store an entry, returning the change in stored bytes """
+        raise NotImplementedError
+
+    def _delete(self, key):
+        """ Delete an entry, returning the number of bytes removed """
+        raise NotImplementedError
+
+    def _touch(self, key):
+        raise NotImplementedError
+
+    def _size(self):
+        """ Return the total stored bytes """
+        raise NotImplementedError
+
+    def _evict(self, total, target):
+        """
+        Evict least recently used entries until at most target bytes are
+        stored, given the tracked total. Returns a tuple of the number of
+        entries evicted and the remaining total
+        """
+        raise NotImplementedError
+
+
+class SQLiteCache(BaseCache):
+    """
+    Cache backed by a single SQLite database file
+    params:
+     - path(str): Database file path
+    """
+    def __init__(self, path, ttl=None, max_size=None):
+        super(SQLiteCache, self).__init__(ttl, max_size)
+        self.path = path
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'key TEXT PRIMARY KEY, value BLOB, created REAL, accessed REAL)'
+        )
+        self._db.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)')
+        self._db.commit()
+        self._touched = 0  # access times updated since the last commit
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def _get(self, key):
+        row = self._db.execute(
+            'SELECT created, value FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], bytes(row[1])
+
+    def _set(self, key, value, created):
+        previous = self._stored(key)
+        self._db.execute(
+            'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+            (key, sqlite3.Binary(value), created, created)
+        )
+        self._commit()
+        return len(value) - previous
+
+    def _delete(self, key):
+        removed = self._stored(key)
+        self._db.execute('DELETE FROM entries WHERE key = ?', (key,))
+        self._commit()
+        return removed
+
+    def _touch(self, key):
+        # access times only order eviction, and are committed in batches
+        self._db.execute(
+            'UPDATE entries SET accessed = ? WHERE key = ?', (time.time(), key)
+        )
+        self._touched += 1
+        if self._touched >= 100:
+            self._commit()
+
+    def _size(self):
+        return self._db.execute(
+            'SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries'
+        ).fetchone()[0]
+
+    def _evict(self, total, target):
+        evicted = []
+        rows = self._db.execute(
+            'SELECT key, LENGTH(value) FROM entries ORDER BY accessed'
+        )
+        for key, size in rows:
+            if total <= target:
+                break
+            evicted.append((key,))
+            total -= size
+        self._db.executemany('DELETE FROM entries WHERE key = ?', evicted)
+        self._commit()
+        return len(evicted), total
+
+    def _stored(self, key):
+        row = self._db.execute(
+            'SELECT LENGTH(value) FROM entries WHERE key = ?', (key,)
+        ).fetchone()
+        return row[0] if row is not None else 0
+
+    def _commit(self):
+        self._db.commit()
+        self._touched = 0
+
+
+class DirectoryCache(BaseCache):
+    """
+    Cache storing one file per entry within a directory
+    params:
+     - path(str): Cache directory, created if not existing
+    """
+    def __init__(self, path, ttl=None, max_size=None):
+        super(DirectoryCache, self).__init__(ttl, max_size)
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _file(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + '.cache')
+
+    def _get(self, key):
+        try:
+            with open(self._file(key), 'rb') as f:
+                return pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            return None
+
+    def _set(self, key, value, created):
+        path = self._file(key)
+        previous = _file_size(path)
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'wb') as f:
+            pickle.dump((created, value), f, pickle.HIGHEST_PROTOCOL)
+            size = f.tell()
+        os.replace(tmp_path, path)
+        return size - previous
+
+    def _delete(self, key):
+        path = self._file(key)
+        size = _file_size(path)
+        try:
+            os.remove(path)
+        except OSError:
+            return 0
+        return size
+
+    def _touch(self, key):
+        # file mtime tracks last access for LRU eviction
+        try:
+            os.utime(self._file(key), None)
+        except OSError:
+            pass
+
+    def _size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self, total, target):
+        # entries are rescanned, counting those written by other processes
+        entries = self._entries()
+        total = sum(e[1] for e in entries)
+        evicted = 0
+        for _, size, name in sorted(entries):
+            if total <= target:
+                break
+            try:
+                os.remove(os.path.join(self.path, name))
+            except OSError:
+                pass
+            total -= size
+            evicted += 1
+        return evicted, total
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.path):
+            if not entry.name.endswith('.cache'):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.name))
+        return entries
+
+
+def _file_size(path):
+    try:
+        return os.stat(path).st_size
+    except OSError:
+        return 0
+
+
+def cache_key(*parts):
+    return '\x1f'.join([str(p) for p in parts])
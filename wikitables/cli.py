@@ -1,12 +1,12 @@
 import sys
-import json
 import logging
 from argparse import ArgumentParser
 
 from wikitables.version import version
-from wikitables.util import TableJSONEncoder
-from wikitables import import_tables
-from wikitables.util import jprint
+from wikitables import import_tables, import_tables_many
+from wikitables.cache import DirectoryCache
+from wikitables.serialize import dump_tables, dump_ndjson, dump_ndjson_tables
+from wikitables.stats import ImportStats, timed
 
 
 log = logging.getLogger('wikitables')
@@ -21,15 +21,40 @@ def main():
     parser.add_argument('-p', '--pretty',
                         action='store_true',
                         help='pretty-print json output')
+    parser.add_argument('-n', '--ndjson',
+                        action='store_true',
+                        help='output newline delimited json, one row per line')
+    parser.add_argument('-f', '--file',
+                        help='read article titles from a file, one per line, or - for stdin')
+    parser.add_argument('-j', '--jobs',
+                        type=int,
+                        default=4,
+                        help='number of concurrent requests for multiple articles '
+                             '(default: %(default)s)')
+    parser.add_argument('-c', '--cache-dir',
+                        help='cache fetched articles in this directory')
+    parser.add_argument('-k', '--continue-on-error',
+                        action='store_true',
+                        help='continue past articles that fail to import, exiting '
+                             'non-zero once done')
+    parser.add_argument('-s', '--stats',
+                        action='store_true',
+                        help='print import timings and counters to stderr')
     parser.add_argument('-d', '--debug',
                         action='store_true',
                         help='enable debug output')
-    parser.add_argument('article', help='article title')
+    parser.add_argument('article', nargs='*', help='article title(s)')
 
     args = parser.parse_args()
 
-    if not args.article:
-        print('usage: wikitables <article title>')
+    titles = list(args.article)
+    if args.file:
+        titles.extend(_read_titles(args.file))
+    elif not titles and not sys.stdin.isatty():
+        titles.extend(_read_titles('-'))
+
+    if not titles:
+        print('usage: wikitables <article title> [<article title> ...]')
         sys.exit(1)
 
     if args.debug:
@@ -38,9 +63,55 @@ def main():
     else:
         logging.basicConfig(level=logging.WARN)
 
-    tables = import_tables(args.article, lang=args.lang)
-    tables_dict = {table.name: table.rows for table in tables}
-    if args.pretty:
-        jprint(tables_dict)
+    stats = ImportStats() if args.stats else None
+    cache = DirectoryCache(args.cache_dir) if args.cache_dir else None
+
+    if len(titles) == 1 and not args.file:
+        tables = import_tables(titles[0], lang=args.lang, cache=cache, stats=stats)
+        with timed(stats, 'serialize'):
+            if args.ndjson:
+                dump_ndjson(tables, sys.stdout)
+            else:
+                dump_tables(tables, sys.stdout, pretty=args.pretty)
+                sys.stdout.write('\n')
+            sys.stdout.flush()
+        failed = 0
     else:
-        print(json.dumps(tables_dict, cls=TableJSONEncoder))
+        failed = _import_many(titles, args, cache, stats)
+
+    if stats is not None:
+        sys.stderr.write(stats.report() + '\n')
+    if failed:
+        sys.exit(1)
+
+
+def _import_many(titles, args, cache, stats):
+    """
+    Import tables from many articles, streaming newline delimited json as
+    each article completes. Returns the number of articles that failed
+    """
+    failed = 0
+    results = import_tables_many(titles, args.lang, jobs=args.jobs, cache=cache,
+                                 raise_errors=False, stats=stats)
+    for title, tables in results:
+        if isinstance(tables, Exception):
+            log.error('%s: %s', title, tables)
+            failed += 1
+            if not args.continue_on_error:
+                break
+            continue
+
+        with timed(stats, 'serialize'):
+            if args.ndjson:
+                dump_ndjson(tables, sys.stdout)
+            else:
+                dump_ndjson_tables(tables, sys.stdout, title)
+            sys.stdout.flush()
+    return failed
+
+
+def _read_titles(path):
+    if path == '-':
+        return [line.strip() for line in sys.stdin if line.strip()]
+    with open(path, encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
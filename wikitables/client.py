@@ -1,33 +1,148 @@
+import re
+import json
+import zlib
 import logging
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
 import requests
+from requests.adapters import HTTPAdapter
+
+from wikitables.cache import cache_key
 
 
 log = logging.getLogger(__name__)
 
+# maximum number of titles per query allowed by the Mediawiki API
+MAX_TITLES = 50
+
+# headings of sections not fetched with sections=True, along with their
+# subsections and any tables within them; as normalized by _heading()
+SKIP_SECTIONS = frozenset([
+    'references', 'notes', 'footnotes', 'citations', 'sources', 'bibliography',
+    'notes and references', 'references and notes', 'further reading',
+    'external links', 'see also',
+])
+
+_tag_re = re.compile(r'<[^>]*>')
+
 
 class ArticleNotFound(RuntimeError):
     """ Article query returned no results """
 
 
 class Client(requests.Session):
-    """ Mediawiki API client """
+    """
+    Mediawiki API client
+    params:
+     - lang(str): Article language
+     - pool_size(int): Maximum number of pooled connections
+     - cache(wikitables.cache.BaseCache): Optional persistent page cache
+     - stats(wikitables.stats.ImportStats): Optional request counters
+    """
 
-    def __init__(self, lang="en"):
+    def __init__(self, lang="en", pool_size=10, cache=None, stats=None):
         super(Client, self).__init__()
+        self.lang = lang
+        self.pool_size = pool_size
+        self.cache = cache
+        self.stats = stats
         self.base_url = 'https://' + lang + '.wikipedia.org/w/api.php'
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, *args, **kwargs):  # pylint: disable=arguments-differ
+        resp = super(Client, self).request(method, url, *args, **kwargs)
+        if self.stats is not None:
+            self.stats.requests += 1
+            self.stats.bytes_fetched += len(resp.content)
+        return resp
+
+    def fetch_page(self, title, method='GET', sections=False):
+        """
+        Query for page by title
+        params:
+         - sections(bool): Fetch the article by section, from its section
+           outline, skipping the reference and link sections in
+           SKIP_SECTIONS that end it, along with any tables within them.
+           Fetched sections are joined in article order, and their tables
+           keep the indexes of a full-page import. Each fetched section
+           costs a request
+        """
+        if self.cache is not None:
+            return self._fetch_cached(title, method, sections)
+        if sections:
+            return self._query_sections(title, method)
+        return self._query_page(title, 'ids|timestamp|content', method)
+
+    def _query_sections(self, title, method):
+        """
+        Query the section outline of a page, then each top-level section
+        not skipped, with its subsections, from the same revision. Pages
+        without trailing sections to skip are fetched whole
+        """
+        params = {
+            'action': 'parse',
+            'format': 'json',
+            'page': _parse_title(title),
+            'prop': 'sections|revid',
+            'redirects': '',
+        }
+        req = self.request(method, self.base_url, params=params)
+        req.raise_for_status()
+        data = req.json()
+        if 'error' in data:
+            if data['error'].get('code') == 'missingtitle':
+                raise ArticleNotFound('no matching articles returned')
+            raise RuntimeError('api error: %s' % data['error'].get('info'))
+        outline = data['parse']
+        indexes = _select_sections(outline['sections'])
+        if indexes is None:
+            # nothing to skip; the revision is fetched whole
+            log.debug('no trailing sections to skip in %s', outline['title'])
+            return self._query_revision(outline['revid'], method)
+
+        # the api reads a single section per request; sections are fetched
+        # concurrently over the connection pool
+        workers = max(1, min(self.pool_size, len(indexes)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            revs = list(executor.map(
+                lambda idx: self._query_revision(outline['revid'], method, idx)['revisions'][0],
+                indexes))
 
-    def fetch_page(self, title, method='GET'):
-        """ Query for page by title """
+        page = {
+            'pageid': outline['pageid'],
+            'title': outline['title'],
+            'revisions': [{
+                'revid': outline['revid'],
+                'timestamp': revs[0].get('timestamp'),
+                '*': '\n'.join(rev['*'] for rev in revs),
+            }],
+        }
+        log.debug('fetched %d of %d sections of %s', len(indexes),
+                  len(outline['sections']) + 1, outline['title'])
+        return page
+
+    def _query_revision(self, revid, method, section=None):
+        # page of a revision, with the content of one of its sections if given
         params = {
             'prop': 'revisions',
             'format': 'json',
             'action': 'query',
-            'explaintext': '',
-            'titles': _parse_title(title),
-            'rvprop': 'content',
+            'revids': revid,
+            'rvprop': 'ids|timestamp|content',
         }
+        if section is not None:
+            params['rvsection'] = section
         req = self.request(method, self.base_url, params=params)
         req.raise_for_status()
+        pages = req.json()['query']['pages']
+        return list(pages.values())[0]
+
+    def _query_page(self, title, rvprop, method):
+        req = self.request(method, self.base_url, params=_page_params(title, rvprop))
+        req.raise_for_status()
         pages = req.json()["query"]["pages"]
         # use key from first result in 'pages' array
         page_id = list(pages.keys())[0]
@@ -36,6 +151,264 @@ class Client(requests.Session):
 
         return pages[page_id]
 
+    def _fetch_cached(self, title, method, sections=False):
+        """
+        Return page from cache if its revision is unchanged, otherwise
+        fetch and store the current revision
+        """
+        key = cache_key(self.lang, _parse_title(title))
+        if sections:
+            # pages fetched by section are cached apart from whole pages
+            key = cache_key(self.lang, _parse_title(title), 'sections')
+        cached = self.cache.get(key)
+        if cached is not None:
+            entry = _load_entry(cached)
+            self.cache.incr('revalidations')
+            page = self._query_page(title, 'ids', method)
+            if page['revisions'][0]['revid'] == entry['revid']:
+                log.debug('cache hit for %s (revid %s)', title, entry['revid'])
+                self._cache_hit(entry)
+                return _cached_page(entry)
+            log.debug('cached revision for %s is stale', title)
+            self.cache.incr('stale')
+        else:
+            self.cache.incr('misses')
+
+        if sections:
+            page = self._query_sections(title, method)
+        else:
+            page = self._query_page(title, 'ids|timestamp|content', method)
+        self.cache.set(key, _dump_entry(page))
+        return page
+
+    def _cache_hit(self, entry):
+        self.cache.incr('hits')
+        self.cache.incr('bytes_saved', len(entry['body'].encode('utf-8')))
+
+    def fetch_pages(self, titles, method='GET', jobs=None, raise_errors=True):
+        """
+        Query for multiple pages by title, packing up to MAX_TITLES titles
+        into each request. Yields a (title, page) tuple per requested title
+        as each batch completes, where page is an ArticleNotFound instance
+        for titles with no matching article
+        params:
+         - jobs(int): Fetch up to this many batches concurrently, over the
+           client's connection pool. Batches are yielded in the order they
+           complete, rather than the order requested
+         - raise_errors(bool): If False, titles of a batch whose request
+           failed are yielded with the exception in place of a page
+        """
+        titles = list(titles)
+        batches = [titles[i:i+MAX_TITLES] for i in range(0, len(titles), MAX_TITLES)]
+        if not jobs or jobs < 2 or len(batches) < 2:
+            for batch in batches:
+                for result in self._fetch_batch_safe(batch, method, raise_errors):
+                    yield result
+            return
+
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            pending = set()
+            batches = iter(batches)
+            while True:
+                # bound the number of fetched batches held in memory
+                for batch in islice(batches, 2 * jobs - len(pending)):
+                    pending.add(executor.submit(
+                        lambda b: list(self._fetch_batch_safe(b, method, raise_errors)), batch))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    for result in future.result():
+                        yield result
+
+    def _fetch_batch_safe(self, titles, method, raise_errors):
+        if raise_errors:
+            return self._fetch_batch(titles, method)
+        try:
+            return list(self._fetch_batch(titles, method))
+        except requests.RequestException as e:
+            log.warning('failed to fetch %d titles: %s', len(titles), e)
+            return [(title, e) for title in titles]
+
+    def _fetch_batch(self, titles, method):
+        parsed = [_parse_title(t) for t in titles]
+        found = {}
+        if self.cache is not None:
+            found = self._fetch_batch_cached(parsed, method)
+
+        missing = sorted(set(parsed) - set(found))
+        if missing:
+            pages, resolved = self._query_batch(missing, 'ids|timestamp|content', method)
+            for ptitle in missing:
+                page = pages.get(_resolve_title(ptitle, resolved))
+                if _is_missing(page):
+                    continue
+                found[ptitle] = page
+                if self.cache is not None:
+                    self.cache.set(cache_key(self.lang, ptitle), _dump_entry(page))
+
+        for title, ptitle in zip(titles, parsed):
+            page = found.get(ptitle)
+            if page is None:
+                log.debug('no matching article for title: %s', title)
+                yield title, ArticleNotFound('no matching articles returned')
+                continue
+            yield title, page
+
+    def _fetch_batch_cached(self, parsed, method):
+        """
+        Return a dict of cached pages by title, for titles whose cached
+        revision is current, revalidating all cached titles in one query
+        """
+        entries = {}
+        for ptitle in sorted(set(parsed)):
+            cached = self.cache.get(cache_key(self.lang, ptitle))
+            if cached is None:
+                self.cache.incr('misses')
+                continue
+            entries[ptitle] = _load_entry(cached)
+        if not entries:
+            return {}
+
+        self.cache.incr('revalidations', len(entries))
+        pages, resolved = self._query_batch(sorted(entries), 'ids', method)
+        found = {}
+        for ptitle, entry in entries.items():
+            page = pages.get(_resolve_title(ptitle, resolved))
+            if not _is_missing(page) and page['revisions'][0]['revid'] == entry['revid']:
+                self._cache_hit(entry)
+                found[ptitle] = _cached_page(entry)
+            else:
+                log.debug('cached revision for %s is stale', ptitle)
+                self.cache.incr('stale')
+        return found
+
+    def _query_batch(self, titles, rvprop, method):
+        """
+        Query a batch of titles, following continuations. Returns a tuple of
+        pages by title and a dict of normalized and redirected titles
+        """
+        params = {
+            'prop': 'revisions',
+            'format': 'json',
+            'action': 'query',
+            'redirects': '',
+            'titles': '|'.join(titles),
+            'rvprop': rvprop,
+        }
+
+        pages, resolved = {}, {}
+        cont = {}
+        while True:
+            req = self.request(method, self.base_url, params=dict(params, **cont))
+            req.raise_for_status()
+            data = req.json()
+            query = data.get('query', {})
+
+            for item in query.get('normalized', []) + query.get('redirects', []):
+                resolved[item['from']] = item['to']
+
+            # pages may be split across continued responses; merge revisions
+            for page in query.get('pages', {}).values():
+                merged = pages.setdefault(page['title'], page)
+                if merged is not page:
+                    merged.setdefault('revisions', []).extend(page.get('revisions', []))
+
+            if 'continue' not in data:
+                break
+            cont = data['continue']
+        return pages, resolved
+
+
+def _select_sections(sections):
+    """
+    Return indexes of the sections to fetch from a section outline: the
+    lead section, and each top-level section preceding the trailing run of
+    sections in SKIP_SECTIONS, or None if the article does not end with any
+    such section. Only trailing sections are skipped, so that fetched tables
+    keep the indexes of a full-page import. Sections transcluded from
+    templates are read within their parent section
+    """
+    indexes = ['0']
+    kept = 1        # number of indexes up to the last section not skipped
+    level = None    # level of the last top-level section
+    for section in sections:
+        if not section['index'].isdigit():
+            continue
+        if level is not None and int(section['level']) > level:
+            # subsections are fetched, or skipped, with their parent
+            continue
+        level = int(section['level'])
+        indexes.append(section['index'])
+        if _heading(section['line']) not in SKIP_SECTIONS:
+            kept = len(indexes)
+    if kept == len(indexes):
+        return None
+    return indexes[:kept]
+
+
+def _heading(line):
+    return ' '.join(_tag_re.sub('', line).lower().split())
+
+
+def _is_missing(page):
+    return page is None or 'missing' in page or 'invalid' in page \
+        or not page.get('revisions')
+
+
+def _load_entry(data):
+    return json.loads(zlib.decompress(data).decode('utf-8'))
+
+
+def _dump_entry(page):
+    rev = page['revisions'][0]
+    entry = {
+        'pageid': page.get('pageid'),
+        'ns': page.get('ns'),
+        'title': page['title'],
+        'revid': rev['revid'],
+        'timestamp': rev.get('timestamp'),
+        'body': rev['*'],
+    }
+    return zlib.compress(json.dumps(entry).encode('utf-8'))
+
+
+def _cached_page(entry):
+    # rebuild an api page result from a cache entry
+    return {
+        'pageid': entry['pageid'],
+        'ns': entry['ns'],
+        'title': entry['title'],
+        'revisions': [{
+            'revid': entry['revid'],
+            'timestamp': entry['timestamp'],
+            '*': entry['body'],
+        }],
+    }
+
+def _resolve_title(title, resolved):
+    # follow normalization and redirect mappings, guarding against cycles
+    seen = set()
+    while title in resolved and title not in seen:
+        seen.add(title)
+        title = resolved[title]
+    return title
+
+
+def _page_params(title, rvprop):
+    # query parameters of a page's latest revision, following redirects as
+    # batch queries do, so a title's cache entry holds the same page either way
+    return {
+        'prop': 'revisions',
+        'format': 'json',
+        'action': 'query',
+        'explaintext': '',
+        'redirects': '',
+        'titles': _parse_title(title),
+        'rvprop': rvprop,
+    }
+
+
 def _parse_title(s):
     # extract title from, potentially, a URL
     return s.split('/')[-1].split('#')[0].split('?')[0]
@@ -0,0 +1,142 @@
+# pylint: disable=useless-object-inheritance
+# Typed column buffers
+from array import array
+from collections import OrderedDict
+
+from wikitables.util import ustr
+
+
+INT64 = 'int64'
+FLOAT64 = 'float64'
+STRING = 'string'
+
+_int64_min, _int64_max = -2 ** 63, 2 ** 63 - 1
+
+
+class Column(object):
+    """
+    Typed column of table values
+    attributes:
+     - name(str): Column name
+     - dtype(str): One of 'int64', 'float64' or 'string'
+     - values(array.array or list): Column values; int64 and float64 columns
+       are stored as arrays with nulls set to 0, string columns as lists
+       with nulls set to None
+     - nulls(bytearray): Null mask, with 1 marking a null value
+    """
+    def __init__(self, name, dtype, values, nulls):
+        self.name = name
+        self.dtype = dtype
+        self.values = values
+        self.nulls = nulls
+
+    def __len__(self):
+        return len(self.values)
+
+    def __repr__(self):
+        return "<Column '%s' %s[%d]>" % (self.name, self.dtype, len(self))
+
+    def to_list(self):
+        """ Return column values as a list, with None for nulls """
+        return [None if n else v for v, n in zip(self.values, self.nulls)]
+
+    def to_numpy(self):
+        """ Return a (values, mask) tuple of numpy arrays """
+        import numpy as np  # pylint: disable=import-outside-toplevel
+
+        mask = np.frombuffer(bytes(self.nulls), dtype=np.bool_)
+        if self.dtype == STRING:
+            return np.array(self.values, dtype=object), mask
+        return np.frombuffer(self.values, dtype=self.dtype), mask
+
+
+class ColumnBuilder(object):
+    """
+    Accumulates values typed by wikitables.inference into a Column,
+    resolving a single type for all values. Columns of ints and floats are
+    upcast to float64, and columns with any string values to string.
+    Missing and empty values are nulls
+    """
+    def __init__(self, name):
+        self.name = name
+        self._values = []
+        self._nulls = bytearray()
+        self._has_float = False
+        self._has_str = False
+
+    def append(self, value):
+        if value is None or value == '':
+            self._values.append(None)
+            self._nulls.append(1)
+            return
+
+        if isinstance(value, int) and not isinstance(value, bool):
+            if not _int64_min <= value <= _int64_max:
+                self._has_float = True
+        elif isinstance(value, float):
+            self._has_float = True
+        else:
+            self._has_str = True
+        self._values.append(value)
+        self._nulls.append(0)
+
+    def finish(self):
+        values, nulls = self._values, self._nulls
+        if self._has_str or not any(v is not None for v in values):
+            values = [None if v is None else ustr(v) for v in values]
+            return Column(self.name, STRING, values, nulls)
+        if self._has_float:
+            return Column(self.name, FLOAT64, array('d', [v or 0.0 for v in values]), nulls)
+        return Column(self.name, INT64, array('q', [v or 0 for v in values]), nulls)
+
+
+def build_columns(head, value_rows):
+    """
+    Build an OrderedDict mapping column names to Columns, from an iterable
+    of value lists ordered by head
+    """
+    builders = [ColumnBuilder(name) for name in head]
+    for values in value_rows:
+        for builder, value in zip(builders, values):
+            builder.append(value)
+    return OrderedDict((b.name, b.finish()) for b in builders)
+
+
+def to_arrow(columns):
+    """ Return a pyarrow.Table from an OrderedDict of Columns """
+    import pyarrow as pa  # pylint: disable=import-outside-toplevel
+
+    arrays = []
+    for col in columns.values():
+        if col.dtype == STRING:
+            arrays.append(pa.array(col.values, type=pa.string()))
+            continue
+        values, mask = col.to_numpy()
+        arrays.append(pa.array(values, mask=mask))
+    return pa.Table.from_arrays(arrays, names=list(columns.keys()))
+
+
+def to_pandas(columns):
+    """
+    Return a pandas.DataFrame of nullable columns from an OrderedDict of
+    Columns. Float columns are float64, with NaN for nulls, before pandas 1.2
+    """
+    import pandas as pd  # pylint: disable=import-outside-toplevel
+
+    data = OrderedDict()
+    for name, col in columns.items():
+        if col.dtype == STRING:
+            data[name] = pd.array(col.values, dtype='string')
+            continue
+        values, mask = col.to_numpy()
+        if col.dtype == INT64:
+            data[name] = pd.arrays.IntegerArray(values.copy(), mask.copy())
+        elif hasattr(pd.arrays, 'FloatingArray'):
+            data[name] = pd.arrays.FloatingArray(values.copy(), mask.copy())
+        else:
+            # pandas before 1.2, the last on Python 3.6, has no nullable
+            # floats; nulls are read as NaN
+            values = values.copy()
+            values[mask] = float('nan')
+            data[name] = values
+    return pd.DataFrame(data)
@@ -0,0 +1,67 @@
+# Shared country lookups and translations
+import gettext
+import logging
+import threading
+
+import pycountry
+
+
+log = logging.getLogger('wikitables')
+
+# country attributes indexed by country_index, in order of precedence
+_index_fields = ('alpha_2', 'alpha_3', 'name', 'numeric', 'official_name', 'common_name')
+
+# gettext domains for country names, by pycountry version
+_domains = ('iso3166-1', 'iso3166')
+
+_lock = threading.Lock()
+_translations = {}
+_INDEX = None
+
+
+def get_translation(lang):
+    """
+    Return the gettext translation of country names for the given language,
+    loaded once per process and shared across readers. Falls back to a
+    null(identity) translation where none is available
+    """
+    try:
+        return _translations[lang]
+    except KeyError:
+        pass
+
+    with _lock:
+        if lang not in _translations:
+            _translations[lang] = _load_translation(lang)
+        return _translations[lang]
+
+
+def _load_translation(lang):
+    for domain in _domains:
+        try:
+            return gettext.translation(domain, pycountry.LOCALES_DIR, languages=[lang])
+        except (IOError, OSError):
+            continue
+    log.debug('no country name translation available for lang: %s', lang)
+    return gettext.NullTranslations()
+
+
+def country_index():
+    """
+    Return a dict mapping lowercased country codes and names to pycountry
+    country objects, built once per process
+    """
+    global _INDEX  # pylint: disable=global-statement
+    if _INDEX is not None:
+        return _INDEX
+
+    with _lock:
+        if _INDEX is None:
+            index = {}
+            for field in _index_fields:
+                for country in pycountry.countries:
+                    value = getattr(country, field, None)
+                    if value:
+                        index.setdefault(value.lower(), country)
+            _INDEX = index
+    return _INDEX
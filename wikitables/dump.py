@@ -0,0 +1,182 @@
+# MediaWiki XML dump reader
+import os
+import re
+import bz2
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from xml.etree import ElementTree
+
+
+log = logging.getLogger('wikitables')
+
+_table_re = re.compile(r'\{\||<table\b', re.I)
+_CHUNK_SIZE = 1 << 20
+
+
+def has_tables(text):
+    """ Cheaply test whether wikitext may contain any tables """
+    return text is not None and _table_re.search(text) is not None
+
+
+def iter_pages(source, namespaces=(0,), require_tables=True):
+    """
+    Stream pages from a MediaWiki XML dump, in constant memory. Pages are
+    yielded as dicts in the same form as returned by Client.fetch_page()
+    params:
+     - source(str or file): Dump file path(optionally .bz2) or file object
+     - namespaces(tuple): Page namespaces to include, or None for all
+     - require_tables(bool): Skip pages without any table markup
+    """
+    if not hasattr(source, 'read'):
+        opener = bz2.open if source.endswith('.bz2') else open
+        with opener(source, 'rb') as f:
+            for page in iter_pages(f, namespaces, require_tables):
+                yield page
+        return
+
+    root = None
+    for event, elem in ElementTree.iterparse(source, events=('start', 'end')):
+        if root is None:
+            root = elem
+        if event != 'end' or _local(elem.tag) != 'page':
+            continue
+
+        page = _read_page(elem, namespaces, require_tables)
+        # release parsed pages to keep memory constant
+        elem.clear()
+        root.clear()
+        if page is not None:
+            yield page
+
+
+def read_index(index_path):
+    """
+    Return the sorted, unique bz2 stream offsets listed in a multistream
+    index file, with lines in the format <offset>:<page_id>:<title>
+    """
+    opener = bz2.open if index_path.endswith('.bz2') else open
+    offsets = set()
+    with opener(index_path, 'rt') as f:
+        for line in f:
+            offset = line.split(':', 1)[0]
+            if offset:
+                offsets.add(int(offset))
+    return sorted(offsets)
+
+
+def iter_stream_pages(path, offset, namespaces=(0,), require_tables=True):
+    """
+    Read pages from the single bz2 stream beginning at the given byte offset
+    of a multistream dump file
+    """
+    decomp = bz2.BZ2Decompressor()
+    chunks = []
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while not decomp.eof:
+            data = f.read(_CHUNK_SIZE)
+            if not data:
+                break
+            chunks.append(decomp.decompress(data))
+    xml = b''.join(chunks)
+
+    # streams hold a sequence of <page> elements, with the dump header and
+    # footer in the first and last streams
+    start, end = xml.find(b'<page>'), xml.rfind(b'</page>')
+    if start == -1 or end == -1:
+        return
+    body = b'<pages>' + xml[start:end + len(b'</page>')] + b'</pages>'
+    for page in ElementTree.fromstring(body):
+        page = _read_page(page, namespaces, require_tables)
+        if page is not None:
+            yield page
+
+
+def import_dump_tables(path, lang='en', index_path=None, workers=None,
+                       namespaces=(0,)):
+    """
+    Import tables from all pages in a MediaWiki XML dump, yielding
+    (title, tables) tuples for pages containing tables. Given the index of a
+    multistream dump, streams are read and parsed across a pool of workers
+    """
+    from wikitables import _read_page_tables  # pylint: disable=import-outside-toplevel
+
+    if not (index_path and workers):
+        for page in iter_pages(path, namespaces):
+            yield page['title'], _read_page_tables(page, lang)
+        return
+
+    for result in _import_streams(path, lang, read_index(index_path), workers, namespaces):
+        yield result
+
+
+def _import_streams(path, lang, offsets, workers, namespaces):
+    from wikitables import WikiTable  # pylint: disable=import-outside-toplevel
+
+    path = os.path.abspath(path)
+    pending = deque()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for offset in offsets:
+            pending.append(executor.submit(_stream_task, path, offset, lang, namespaces))
+            while len(pending) > 2 * workers:
+                for title, tables in pending.popleft().result():
+                    yield title, [WikiTable.load(data) for data in tables]
+
+        while pending:
+            for title, tables in pending.popleft().result():
+                yield title, [WikiTable.load(data) for data in tables]
+
+
+def _stream_task(path, offset, lang, namespaces):
+    # worker task returning tables from a single stream as plain values
+    from wikitables import _read_page_tables  # pylint: disable=import-outside-toplevel
+
+    results = []
+    for page in iter_stream_pages(path, offset, namespaces):
+        tables = _read_page_tables(page, lang)
+        results.append((page['title'], [t.dump() for t in tables]))
+    return results
+
+
+def _read_page(elem, namespaces, require_tables):
+    ns = _child_text(elem, 'ns')
+    if namespaces is not None and (ns is None or int(ns) not in namespaces):
+        return None
+
+    revision = _child(elem, 'revision')
+    if revision is None:
+        return None
+    text = _child_text(revision, 'text')
+    if require_tables and not has_tables(text):
+        return None
+
+    revid = _child_text(revision, 'id')
+    pageid = _child_text(elem, 'id')
+    return {
+        'pageid': int(pageid) if pageid else None,
+        'ns': int(ns) if ns else None,
+        'title': _child_text(elem, 'title'),
+        'revisions': [{
+            'revid': int(revid) if revid else None,
+            'timestamp': _child_text(revision, 'timestamp'),
+            '*': text or '',
+        }],
+    }
+
+
+def _local(tag):
+    # strip xml namespace from tag
+    return tag.rsplit('}', 1)[-1]
+
+
+def _child(elem, name):
+    for child in elem:
+        if _local(child.tag) == name:
+            return child
+    return None
+
+
+def _child_text(elem, name):
+    child = _child(elem, name)
+    return child.text if child is not None else None
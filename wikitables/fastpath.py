@@ -0,0 +1,316 @@
+# pylint: disable=useless-object-inheritance
+# Line-oriented wikitable tokenizer
+import re
+
+import mwparserfromhell as mwp
+
+from wikitables.models import LazyNode, RowNodes, read_row_nodes
+from wikitables.scanner import scan_tables, iter_tables as _parser_iter_tables
+from wikitables.util import ftag
+
+
+# markup the tokenizer leaves to the parser: templates, nested tables,
+# entities, tags other than <br>, comments, free links, magic words and
+# signatures
+_unsafe_re = re.compile(r"[{}&\x00]|<(?!br\s*/?>)|://|__|~~~", re.I)
+_inline_re = re.compile(r"\[\[([^\[\]|<\n]*)(?:\|([^\[\]|<\n]*))?\]\]|('{2,})|<br\s*/?>", re.I)
+_link_re = re.compile(r'\[\[[^\[\]]*\]\]')
+_attr_re = re.compile(r'''\s*([A-Za-z][\w.:-]*)=(?:"([^"\n]*)"|'([^'\n]*)'|([^\s"'|=]+))''')
+_row_re = re.compile(r'\|-(?:[ \t].*)?$')
+
+# apostrophe runs toggling italic(2), bold(3) or both(5)
+_styles = {2: ('i',), 3: ('b',), 5: ('i', 'b')}
+
+
+class FastCell(object):  # pylint: disable=too-few-public-methods
+    """
+    Table cell read by the line-oriented tokenizer, in place of a `th` or
+    `td` node
+    attributes:
+     - tag(str): 'th' or 'td'
+     - attrs(dict): Cell attributes
+     - parts(list): Non-empty value parts, as FieldReader reads them
+     - name(str): Cell text as a column name, as from strip_code()
+     - raw(wikitables.models.LazyNode): The cell node, parsed on access
+    """
+    __slots__ = ('tag', 'attrs', 'parts', 'name', 'raw')
+
+    def __init__(self, tag, attrs, parts, name, raw=None):
+        self.tag = tag
+        self.attrs = attrs
+        self.parts = parts
+        self.name = name
+        self.raw = raw
+
+
+class FastTable(object):
+    """
+    Wikitable read by the line-oriented tokenizer, in place of a `table`
+    node. Raw row and cell nodes are parsed from its source on first access
+    attributes:
+     - source(str): Table wikitext
+     - head(list): FastCell objects of `th` cells outside of any row
+     - rows(list): wikitables.models.RowNodes of FastCell objects
+    """
+    __slots__ = ('source', 'head', 'rows', '_nodes')
+
+    def __init__(self, source):
+        self.source = source
+        self.head = []
+        self.rows = []
+        self._nodes = None
+
+    def __str__(self):
+        return self.source
+
+    def resolve(self, ridx, cidx=None):
+        """ Return the parsed `tr` node of a row, or of a cell within it """
+        if self._nodes is None:
+            node = mwp.parse(self.source).filter_tags(matches=ftag('table'))[0]
+            self._nodes = read_row_nodes(node)[1]
+        row = self._nodes[ridx]
+        if cidx is None:
+            return row.node
+        return row.cells[cidx]
+
+
+def iter_tables(text):
+    """
+    Generator of tables within the given wikitext, as iter_tables() in
+    wikitables.scanner. Each top-level wikitable is read by the line-oriented
+    tokenizer where possible, yielding a FastTable; any table using markup
+    the tokenizer does not handle is parsed as before, yielding its node and
+    those of its nested tables
+    """
+    spans = scan_tables(text)
+    if spans is None:
+        for table in _parser_iter_tables(text):
+            yield table
+        return
+
+    # nested tables are read with their parent
+    top_level = [(start, end) for start, end, depth in spans if not depth]
+    for start, end in top_level:
+        source = text[start:end]
+        table = read_table(source)
+        if table is not None:
+            yield table
+            continue
+        for table in mwp.parse(source).filter_tags(matches=ftag('table')):
+            yield table
+
+
+def read_table(source):
+    """
+    Tokenize the source of a single wikitable, returning a FastTable or
+    None if it uses markup the tokenizer does not handle
+    """
+    lines = source.split('\n')
+    if len(lines) < 2 or not lines[0].startswith('{|') or lines[-1] != '|}':
+        return None
+    if _unsafe_re.search(lines[0], 2) or any(_unsafe_re.search(l) for l in lines[1:-1]):
+        return None
+
+    table = FastTable(source)
+    row = None        # cells of the current row, or None outside rows
+    ridx = -1
+    cell = None       # [tag, attrs, content] of the current cell
+    cells = []        # cells of the current line, flushed at its end
+    has_contents = False
+
+    def flush():
+        for tag, attrs, content in cells:
+            if tag is None:
+                # captions are not read, but must be tokenized alike
+                _read_content(content)
+                continue
+            if row is None:
+                if tag == 'th':
+                    table.head.append(_make_cell(tag, attrs, content))
+                continue
+            if tag is not None:
+                raw = LazyNode(_Resolver(table, ridx, len(row)))
+                row.append(_make_cell(tag, attrs, content, raw))
+        del cells[:]
+
+    def end_row():
+        if row is not None:
+            nth = sum(1 for c in row if c.tag == 'th')
+            node = _LazyRow(_Resolver(table, ridx), has_contents)
+            table.rows.append(RowNodes(node, row, nth))
+
+    try:
+        for line in lines[1:-1]:
+            if _row_re.match(line):
+                flush()
+                end_row()
+                row, ridx, cell, has_contents = [], ridx + 1, None, False
+                continue
+            has_contents = True
+            if line.startswith('|-'):
+                return None
+            if line.startswith('|+'):
+                if row is not None or '||' in line:
+                    return None
+                flush()
+                # captions are read as cells outside of any row, and ignored
+                cell = [None, None, line[2:] + '\n']
+                cells.append(cell)
+                continue
+            if line.startswith('|') or line.startswith('!'):
+                flush()
+                for cell in _split_cells(line):
+                    cells.append(cell)
+                continue
+            _check_continuation(line)
+            if cell is not None:
+                cell[2] += line + '\n'
+        flush()
+        end_row()
+    except _Unsupported:
+        return None
+
+    return table
+
+
+class _Unsupported(Exception):
+    pass
+
+
+class _LazyRow(LazyNode):
+    """ LazyNode of a `tr` node, and whether it has any contents """
+    __slots__ = ('contents',)
+
+    def __init__(self, resolve, contents):
+        super(_LazyRow, self).__init__(resolve)
+        self.contents = contents
+
+
+class _Resolver(object):
+    __slots__ = ('table', 'ridx', 'cidx')
+
+    def __init__(self, table, ridx, cidx=None):
+        self.table = table
+        self.ridx = ridx
+        self.cidx = cidx
+
+    def __call__(self):
+        return self.table.resolve(self.ridx, self.cidx)
+
+
+def _check_continuation(line):
+    # continuation of the last cell, without markup of its own
+    if line and line[0] in ' \t*#:;=' or line.startswith('----'):
+        raise _Unsupported()
+    if '||' in line or '!!' in line or '|' in _link_re.sub('', line):
+        raise _Unsupported()
+
+
+def _split_cells(line):
+    tag = 'th' if line[0] == '!' else 'td'
+    sep = '!!' if tag == 'th' else '||'
+    other = '||' if tag == 'th' else '!!'
+
+    # pipes within links are masked while splitting cells and attributes
+    masked = _link_re.sub(lambda m: m.group(0).replace('|', '\x00'), line[1:])
+    if other in masked:
+        raise _Unsupported()
+
+    cells = []
+    for seg in masked.split(sep):
+        if seg.count('|') > 1:
+            raise _Unsupported()
+        attrs = {}
+        if '|' in seg:
+            attr_text, seg = seg.split('|')
+            if '\x00' in attr_text:
+                raise _Unsupported()
+            attrs = _read_attrs(attr_text)
+        cells.append([tag, attrs, seg.replace('\x00', '|')])
+    cells[-1][2] += '\n'
+    return cells
+
+
+def _read_attrs(text):
+    attrs = {}
+    pos = 0
+    while pos < len(text):
+        m = _attr_re.match(text, pos)
+        if m is None:
+            if text[pos:].strip(' '):
+                raise _Unsupported()
+            break
+        if pos and m.start(1) == pos:
+            # attributes must be separated by whitespace
+            raise _Unsupported()
+        value = m.group(2)
+        if value is None:
+            value = m.group(3) if m.group(3) is not None else m.group(4)
+        attrs[m.group(1)] = value
+        pos = m.end()
+    if not attrs:
+        raise _Unsupported()
+    return attrs
+
+
+def _make_cell(tag, attrs, content, raw=None):
+    parts, name = _read_content(content)
+    return FastCell(tag, attrs, parts, name, raw)
+
+
+def _read_content(content):
+    """
+    Return (parts, name) of cell content; parts as FieldReader reads the
+    cell's nodes, and name as strip_code() of its contents
+    """
+    parts, names = [], []
+    stack = []  # open styles, with the line they were opened on
+    line = 0
+    pos = 0
+
+    def text(value):
+        if '[' in value or ']' in value:
+            raise _Unsupported()
+        parts.append(value)
+        names.append(value)
+
+    for m in _inline_re.finditer(content):
+        text(content[pos:m.start()])
+        line += content.count('\n', pos, m.start())
+        pos = m.end()
+
+        title, label, quotes = m.group(1), m.group(2), m.group(3)
+        if quotes is not None:
+            styles = _styles.get(len(quotes))
+            if styles is None:
+                raise _Unsupported()
+            _toggle(stack, styles, line)
+            continue
+        if title is not None:
+            if not title.strip() or "''" in title or (label and "''" in label):
+                raise _Unsupported()
+            # an empty label is falsy as a value, but stripped as such
+            parts.append(label or title)
+            names.append(title if label is None else label)
+    text(content[pos:])
+    if stack:
+        raise _Unsupported()
+
+    parts = [p.strip(' \n\t') for p in parts]
+    name = ''.join(names).strip('\n')
+    while '\n\n\n' in name:
+        name = name.replace('\n\n\n', '\n\n')
+    return [p for p in parts if p], name
+
+
+def _toggle(stack, styles, line):
+    opened = [s for s, _ in stack]
+    top = stack[len(stack) - len(styles):]
+    if len(top) == len(styles) and sorted(s for s, _ in top) == sorted(styles) and \
+            all(l == line for _, l in top):
+        del stack[len(stack) - len(styles):]
+    elif any(style in opened for style in styles):
+        # improperly nested or reinterpreted styles
+        raise _Unsupported()
+    else:
+        stack.extend((style, line) for style in styles)
@@ -0,0 +1,177 @@
+# pylint: disable=useless-object-inheritance
+# Lazy table index
+import re
+import logging
+
+import mwparserfromhell as mwp
+
+from wikitables import fastpath
+from wikitables.readers import ReadOptions
+from wikitables.scanner import scan_tables
+from wikitables.table import WikiTable
+from wikitables.util import ftag, ustr
+
+
+log = logging.getLogger('wikitables')
+
+_class_re = re.compile(r'''\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s|>]+))''', re.I)
+_wiki_head_end_re = re.compile(r'^[ \t]*(?:\|-|\|(?!\+)|!)', re.M)
+_wiki_caption_re = re.compile(r'^[ \t]*\|\+(.*)$', re.M)
+_html_head_end_re = re.compile(r'<(?:tr|td|th)\b', re.I)
+_html_caption_re = re.compile(r'<caption\b[^>]*>(.*?)</caption\s*>', re.I | re.S)
+
+
+class TableHandle(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Unparsed table within an article. The table is parsed on first access
+    of its head, and its rows read on first access of its rows
+    attributes:
+     - name(str): Table name in the format <article_name>[<table_index>]
+     - index(int): Table index within the article
+     - caption(str): Table caption, or None
+     - classes(list): Table CSS classes
+    params:
+     - fast(bool): Read a plain wikitable by the line-oriented tokenizer,
+       see wikitables.fastpath
+     - options: Keyword arguments of wikitables.readers.ReadOptions, passed
+       to the WikiTable
+    """
+    def __init__(self, name, index, source, lang='en', node=None, *,  # pylint: disable=too-many-arguments
+                 fast=False, **options):
+        self.name = ustr(name)
+        self.index = index
+        self.source = source
+        self.lang = lang
+        self.fast = fast
+        self.options = options
+        self._node = node
+        self._table = None
+
+        opening, head = _split_head(source)
+        self.classes = _read_classes(opening)
+        self.caption = _read_caption(head)
+
+    def __repr__(self):
+        return "<TableHandle '%s'>" % self.name
+
+    @property
+    def table(self):
+        """ Lazily parsed wikitables.WikiTable """
+        if self._table is None:
+            node = self._node
+            if node is None and self.fast:
+                node = fastpath.read_table(self.source)
+            if node is None:
+                node = mwp.parse(self.source).filter_tags(matches=ftag('table'))[0]
+            self._table = WikiTable(self.name, node, self.lang, lazy=True, **self.options)
+            self._node = None
+        return self._table
+
+    @property
+    def ncols(self):
+        return len(self.table.head)
+
+    @property
+    def head(self):
+        return self.table.head
+
+    @property
+    def rows(self):
+        return self.table.rows
+
+    def json(self):
+        return self.table.json()
+
+
+class TableIndex(list):
+    """
+    List of TableHandle objects for all tables within an article, located
+    without parsing the article. Keyword arguments are passed to each
+    TableHandle
+    """
+    @classmethod
+    def from_page(cls, page, lang='en', **options):
+        return cls.from_text(page['title'], page['revisions'][0]['*'], lang, **options)
+
+    @classmethod
+    def from_text(cls, title, text, lang='en', fast=False, **options):
+        # options are checked before any table is parsed
+        ReadOptions(**options)
+        index = cls()
+        spans = scan_tables(text)
+        if spans is None:
+            nodes = mwp.parse(text).filter_tags(matches=ftag('table'))
+            for idx, node in enumerate(nodes):
+                name = '%s[%s]' % (title, idx)
+                index.append(TableHandle(name, idx, ustr(node), lang, node, **options))
+            return index
+
+        for idx, (start, end, _) in enumerate(spans):
+            name = '%s[%s]' % (title, idx)
+            index.append(TableHandle(name, idx, text[start:end], lang, fast=fast,
+                                     **options))
+        return index
+
+    def select(self, index=None, caption=None, cls=None):
+        """
+        Return table handles matching all of the given criteria
+        params:
+         - index(int or list): Table index or indices
+         - caption(str): Regular expression to search table captions for
+         - cls(str): CSS class name, e.g. 'wikitable'
+        """
+        if isinstance(index, int):
+            index = [index]
+        caption_re = re.compile(caption) if caption is not None else None
+
+        selected = []
+        for handle in self:
+            if index is not None and handle.index not in index:
+                continue
+            if caption_re is not None and \
+                    (handle.caption is None or not caption_re.search(handle.caption)):
+                continue
+            if cls is not None and cls not in handle.classes:
+                continue
+            selected.append(handle)
+        return selected
+
+
+def _split_head(source):
+    # split table source into its opening markup, and content preceding
+    # the first row or cell
+    if source.startswith('{|'):
+        opening_end = source.find('\n')
+        if opening_end == -1:
+            return source, ''
+        m = _wiki_head_end_re.search(source, opening_end + 1)
+        head_end = m.start() if m else len(source)
+        return source[:opening_end], source[opening_end:head_end]
+
+    opening_end = source.find('>') + 1
+    m = _html_head_end_re.search(source, opening_end)
+    head_end = m.start() if m else len(source)
+    return source[:opening_end], source[opening_end:head_end]
+
+
+def _read_classes(opening):
+    m = _class_re.search(opening)
+    if not m:
+        return []
+    return [x for x in m.group(m.lastindex).split() if x]
+
+
+def _read_caption(head):
+    m = _wiki_caption_re.search(head)
+    if m:
+        caption = m.group(1)
+        # caption attributes are separated from the caption by a single '|'
+        parts = re.split(r'(?<!\|)\|(?!\|)', caption, maxsplit=1)
+        if len(parts) == 2 and '[[' not in parts[0]:
+            caption = parts[1]
+    else:
+        m = _html_caption_re.search(head)
+        if not m:
+            return None
+        caption = m.group(1)
+    return ustr(mwp.parse(caption).strip_code()).strip()
@@ -0,0 +1,150 @@
+# pylint: disable=useless-object-inheritance
+# Cell value type inference
+import re
+from functools import lru_cache
+
+
+# languages writing numbers with a decimal comma, grouping digits with
+# periods or spaces
+_decimal_comma = frozenset((
+    'bg', 'ca', 'cs', 'da', 'de', 'el', 'es', 'et', 'eu', 'fi', 'fr', 'gl',
+    'hr', 'hu', 'id', 'is', 'it', 'lt', 'lv', 'nb', 'nl', 'nn', 'no', 'pl',
+    'pt', 'ro', 'ru', 'sk', 'sl', 'sr', 'sv', 'tr', 'uk', 'vi',
+))
+
+# minus signs normalized to '-', and digit group spaces removed
+_translate = {
+    0x2212: '-',   # minus sign
+    0xfe63: '-',   # small hyphen-minus
+    0xff0d: '-',   # fullwidth hyphen-minus
+    0x00a0: None,  # no-break space
+    0x2007: None,  # figure space
+    0x2009: None,  # thin space
+    0x202f: None,  # narrow no-break space
+}
+
+# unparsed html entities as read from wikitext
+_entities = (
+    ('&minus;', '-'),
+    ('&nbsp;', ''),
+    ('&thinsp;', ''),
+    ('&#160;', ''),
+    ('&#8201;', ''),
+    ('&#8239;', ''),
+)
+
+# leading signs of integers read by int()
+_signs = frozenset('+-')
+
+# numbers with a decimal point and no digit grouping
+_point_re = re.compile(r'\s*[+-]?(?:\d+(\.\d*)?|(\.)\d+)([eE][+-]?\d+)?\s*$')
+
+# numbers with a decimal comma and optional period digit grouping
+_comma_re = re.compile(r'\s*[+-]?(?:\d{1,3}(?:\.\d{3})+|\d+)(,\d+)?\s*$')
+
+
+class TypeInferer(object):
+    """
+    Classifies and converts cell values to int or float, by the numeric
+    conventions of a given language, without raising exceptions for values
+    that are not numbers. Values that are not numbers are returned unchanged
+    params:
+     - lang(str): Wikipedia language code
+    """
+    __slots__ = ('lang', 'decimal_comma')
+
+    def __init__(self, lang='en'):
+        self.lang = lang
+        self.decimal_comma = lang.split('-', 1)[0] in _decimal_comma
+
+    def guess(self, value):  # pylint: disable=too-many-return-statements,too-many-branches
+        """ Return value converted to int or float, if numeric """
+        # kept as a single function, called once per field
+        # plain, grouped and signed integers, the most common numbers, are
+        # checked first, once digit group commas are removed wherever they
+        # occur. Signed values are read by int(), as by guess_type()
+        s = value if self.decimal_comma else value.replace(',', '')
+        if s.isdecimal():
+            return int(s)
+        if s[:1] in _signs:
+            try:
+                return int(s)
+            except ValueError:
+                pass
+        elif s[:1].isalpha():
+            return value
+
+        if '&' in s:
+            for entity, repl in _entities:
+                s = s.replace(entity, repl)
+        try:
+            s.encode('ascii')
+        except UnicodeEncodeError:
+            s = s.translate(_translate)
+
+        if self.decimal_comma:
+            m = _comma_re.match(s)
+            if m is not None:
+                s = s.replace('.', '')
+                if m.group(1):
+                    return float(s.replace(',', '.'))
+                return int(s)
+
+        if s.isdecimal():
+            return int(s)
+        m = _point_re.match(s)
+        if m is None:
+            return value
+        if m.lastindex is None:
+            return int(s)
+        return float(s)
+
+    __call__ = guess
+
+
+@lru_cache(maxsize=None)
+def type_inferer(lang):
+    """ Return the TypeInferer for a given language, shared across readers """
+    return TypeInferer(lang)
+
+
+class ColumnSampler(object):
+    """
+    Decides once per column whether values are inferred, from the first
+    `size` non-empty string values of each column. Columns without any
+    typed values in their sample are read as text thereafter, skipping
+    inference entirely
+    params:
+     - infer(callable): Per value type inference
+     - size(int): Number of values sampled per column
+    """
+
+    def __init__(self, infer, size=20):
+        self.infer = infer
+        self.size = size
+        self._sampled = []  # per column position, number of values sampled
+        self._typed = []    # per column position, True, False or None if undecided
+
+    def apply(self, cells):
+        """
+        Infer values of a row of fields by column position, in place
+        """
+        sampled, typed = self._sampled, self._typed
+        while len(typed) < len(cells):
+            sampled.append(0)
+            typed.append(None)
+
+        for pos, f in enumerate(cells):
+            if f is None or typed[pos] is False:
+                continue
+            value = f.value
+            if not isinstance(value, str) or not value:
+                continue
+            f.value = self.infer(value)
+            if typed[pos] is None:
+                if not isinstance(f.value, str):
+                    typed[pos] = True
+                    continue
+                sampled[pos] += 1
+                if sampled[pos] >= self.size:
+                    typed[pos] = False
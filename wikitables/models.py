@@ -1,8 +1,26 @@
 # pylint: disable=useless-object-inheritance
 
-import json
+from collections.abc import Mapping
 
-from wikitables.util import TableJSONEncoder
+from mwparserfromhell.nodes.tag import Tag
+
+from wikitables import serialize
+from wikitables.util import ustr
+
+_section_tags = ('tbody', 'thead', 'tfoot')
+
+
+class LazyNode(object):
+    """
+    Placeholder for an unparsed node, resolved on first access
+    """
+    __slots__ = ('_resolve',)
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def resolve(self):
+        return self._resolve()
 
 
 class Field(object):
@@ -12,6 +30,8 @@ class Field(object):
      - raw(mwparserfromhell.nodes.Node) - Unparsed field Wikicode
      - value(str) - Parsed field value as string
     """
+    __slots__ = ('_raw', 'value', 'attrs')
+
     def __init__(self, node, value, attrs=None):
         if attrs is None:
             attrs = {}
@@ -19,6 +39,16 @@ class Field(object):
         self.value = value
         self.attrs = attrs
 
+    @property
+    def raw(self):
+        if isinstance(self._raw, LazyNode):
+            self._raw = self._raw.resolve()
+        return self._raw
+
+    @raw.setter
+    def raw(self, node):
+        self._raw = node
+
     def __str__(self):
         return str(self.value)
 
@@ -38,8 +68,18 @@ class Row(dict):
         self.name = name
         self.raw = node
 
+    @property
+    def raw(self):
+        if isinstance(self._raw, LazyNode):
+            self._raw = self._raw.resolve()
+        return self._raw
+
+    @raw.setter
+    def raw(self, node):
+        self._raw = node
+
     def json(self):
-        return json.dumps(self, cls=TableJSONEncoder)
+        return serialize.dumps_row(self)
 
     @property
     def is_null(self):
@@ -47,3 +87,133 @@ class Row(dict):
             if item.value != '':
                 return False
         return True
+
+
+class CompactRow(Mapping):
+    """
+    Memory-compact WikiTable row; a read-only mapping of field name(str) to
+    wikitables.Field obj, backed by a tuple of fields by column position and
+    a header index shared by all rows of a table
+    """
+    __slots__ = ('name', '_raw', '_index', '_fields')
+
+    def __init__(self, name, node, index, fields):
+        self.name = name
+        self._raw = node
+        self._index = index
+        self._fields = fields
+
+    @property
+    def raw(self):
+        if isinstance(self._raw, LazyNode):
+            self._raw = self._raw.resolve()
+        return self._raw
+
+    def __getitem__(self, key):
+        f = self._fields[self._index[key]]
+        if f is None:
+            raise KeyError(key)
+        return f
+
+    def __iter__(self):
+        fields = self._fields
+        for key, pos in self._index.items():
+            if fields[pos] is not None:
+                yield key
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+    def __json__(self):
+        return dict(self)
+
+    def json(self):
+        return serialize.dumps_row(self)
+
+    @property
+    def is_null(self):
+        for f in self._fields:
+            if f is not None and f.value != '':
+                return False
+        return True
+
+
+class RowNodes(object):  # pylint: disable=too-few-public-methods
+    """
+    Nodes of a single table row
+    attributes:
+     - node(mwparserfromhell.nodes.Tag): The `tr` node, or a LazyNode of
+       it for rows of a wikitables.fastpath.FastTable
+     - cells(list): The row's `th` and `td` nodes, or FastCell objects
+     - nth(int): Number of `th` nodes
+    """
+    __slots__ = ('node', 'cells', 'nth')
+
+    def __init__(self, node, cells, nth):
+        self.node = node
+        self.cells = cells
+        self.nth = nth
+
+
+def read_row_nodes(table):
+    """
+    Return a (header cells, rows) tuple for a parsed table node, from a
+    single non-recursive pass over its contents. Header cells are `th` nodes
+    outside of any row, and rows a list of RowNodes. Rows within `tbody`,
+    `thead` and `tfoot` sections are included; rows of nested tables are not
+    """
+    head, rows = [], []
+    _read_section(table, head, rows)
+    return head, rows
+
+
+def detach_row_nodes(table):
+    """
+    Remove the rows read by read_row_nodes() from a parsed table node,
+    leaving each row referenced only by its RowNodes
+    """
+    _detach_section(table)
+
+
+def _detach_section(section):
+    kept = []
+    for node in section.contents.nodes:
+        if isinstance(node, Tag):
+            tag = ustr(node.tag).lower()
+            if tag == 'tr':
+                continue
+            if tag in _section_tags and node.contents:
+                _detach_section(node)
+        kept.append(node)
+    section.contents.nodes[:] = kept
+
+
+def _read_section(section, head, rows):
+    for node in section.contents.nodes:
+        if not isinstance(node, Tag):
+            continue
+        tag = ustr(node.tag).lower()
+        if tag == 'tr':
+            rows.append(_read_row(node))
+        elif tag == 'th':
+            head.append(node)
+        elif tag in _section_tags and node.contents:
+            _read_section(node, head, rows)
+
+
+def _read_row(node):
+    cells, nth = [], 0
+    if node.contents:
+        for cell in node.contents.nodes:
+            if not isinstance(cell, Tag):
+                continue
+            tag = ustr(cell.tag).lower()
+            if tag == 'th':
+                nth += 1
+                cells.append(cell)
+            elif tag == 'td':
+                cells.append(cell)
+    return RowNodes(node, cells, nth)
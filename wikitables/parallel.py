@@ -0,0 +1,135 @@
+# pylint: disable=useless-object-inheritance
+# Process pool table importer
+import os
+import logging
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from wikitables.client import Client
+from wikitables.scanner import scan_tables, parse_tables
+from wikitables.stats import ImportStats, timed, timed_iter
+from wikitables.table import WikiTable
+
+
+log = logging.getLogger('wikitables')
+
+
+class ParallelImporter(object):
+    """
+    Parse tables from many articles across a pool of worker processes.
+    Workers return tables as plain values(see WikiTable.dump()), which are
+    rehydrated in the calling process
+    params:
+     - lang(str): Article language
+     - workers(int): Number of worker processes, default os.cpu_count()
+     - split_size(int): Articles larger than this many characters are split
+       into one task per table
+     - max_pending(int): Maximum number of articles queued or in progress,
+       bounding memory held by pending results
+     - max_tasks_per_child(int): Restart worker processes after this many
+       tasks (Python 3.11+)
+    """
+    def __init__(self, lang='en', workers=None, split_size=200000,
+                 max_pending=None, max_tasks_per_child=None):
+        self.lang = lang
+        self.workers = workers
+        self.split_size = split_size
+        self.max_pending = max_pending
+        self.max_tasks_per_child = max_tasks_per_child
+
+    def import_titles(self, titles, client=None, jobs=None, raise_errors=True, stats=None):
+        """
+        Fetch and import tables from the given article titles, yielding
+        (title, tables) tuples in the order fetched, where tables is an
+        ArticleNotFound instance for titles with no matching article. jobs
+        and raise_errors are as for Client.fetch_pages(), and stats as for
+        import_pages()
+        """
+        if client is None:
+            with Client(self.lang, pool_size=max(10, jobs or 0), stats=stats) as own_client:
+                for result in self.import_titles(titles, own_client, jobs, raise_errors, stats):
+                    yield result
+            return
+
+        pages = client.fetch_pages(titles, jobs=jobs, raise_errors=raise_errors)
+        pages = timed_iter(stats, 'fetch', pages)
+        for result in self.import_pages(pages, raise_errors, stats):
+            yield result
+
+    def import_pages(self, pages, raise_errors=True, stats=None):
+        """
+        Import tables from an iterable of (title, page) tuples, as yielded
+        by Client.fetch_pages(), yielding (title, tables) tuples in order.
+        Exceptions in place of a page are yielded as given. With
+        raise_errors=False, exceptions parsing an article are yielded in
+        place of its tables. Timings and counters of worker processes are
+        added to a given wikitables.stats.ImportStats
+        """
+        workers = self.workers or os.cpu_count() or 1
+        max_pending = self.max_pending or 2 * workers
+        kwargs = {'max_workers': workers}
+        if self.max_tasks_per_child is not None:
+            kwargs['max_tasks_per_child'] = self.max_tasks_per_child
+
+        with ProcessPoolExecutor(**kwargs) as executor:
+            pending = deque()
+
+            for title, page in pages:
+                if isinstance(page, Exception):
+                    pending.append((title, page))
+                else:
+                    pending.append((title, self._submit(executor, page, stats is not None)))
+
+                while len(pending) > max_pending:
+                    yield _collect(pending.popleft(), raise_errors, stats)
+
+            while pending:
+                yield _collect(pending.popleft(), raise_errors, stats)
+
+    def _submit(self, executor, page, with_stats):
+        title = page['title']
+        body = page['revisions'][0]['*']
+        spans = scan_tables(body) if len(body) > self.split_size else None
+        if not spans:
+            return [executor.submit(_parse_task, title, body, self.lang, 0, with_stats)]
+
+        log.debug('splitting %s into %d table tasks', title, len(spans))
+        futures = []
+        for idx, (start, end, depth) in enumerate(spans):
+            if depth:
+                continue
+            futures.append(executor.submit(
+                _parse_task, title, body[start:end], self.lang, idx, with_stats))
+        return futures
+
+
+def _collect(item, raise_errors, stats):
+    title, futures = item
+    if isinstance(futures, Exception):
+        return title, futures
+    tables = []
+    try:
+        for future in futures:
+            dumped, task_stats = future.result()
+            if task_stats is not None:
+                stats.merge(task_stats)
+            tables.extend([WikiTable.load(data) for data in dumped])
+    except Exception as e:  # pylint: disable=broad-except
+        if raise_errors:
+            raise
+        log.warning('failed to import tables from %s: %s', title, e)
+        return title, e
+    return title, tables
+
+
+def _parse_task(title, text, lang, first_idx, with_stats):
+    # worker task returning tables within text as plain values, and the
+    # task's stats
+    stats = ImportStats() if with_stats else None
+    with timed(stats, 'parse'):
+        nodes = parse_tables(text)
+    tables = []
+    for idx, node in enumerate(nodes, first_idx):
+        name = '%s[%s]' % (title, idx)
+        tables.append(WikiTable(name, node, lang, stats=stats).dump())
+    return tables, stats
@@ -1,44 +1,162 @@
 # pylint: disable=invalid-name,useless-object-inheritance
 
+import time
 import logging
-from collections import defaultdict
-import gettext
+from collections import OrderedDict, namedtuple
 
-import pycountry
 from mwparserfromhell.nodes.tag import Tag
 from mwparserfromhell.nodes.template import Template
 from mwparserfromhell.nodes.wikilink import Wikilink
 
-from wikitables.models import Field, Row
-from wikitables.util import ftag, ustr, guess_type
-from wikitables.templates import read_template
+from wikitables.columns import ColumnBuilder
+from wikitables.countries import get_translation
+from wikitables.fastpath import FastCell, FastTable
+from wikitables.inference import ColumnSampler, type_inferer
+from wikitables.models import Field, Row, CompactRow, detach_row_nodes, read_row_nodes
+from wikitables.util import ustr
+from wikitables.templates import read_template, reads_fields
 
 
 log = logging.getLogger('wikitables')
 
 ignore_attrs = ['group="Note"']
 
-
-class FieldReader(object):
-    """ Stateful Field value reader """
-
-    def __init__(self, lang='en'):
+# value of a cell skipped until its column is read
+_unread = object()
+
+
+_ReadOptions = namedtuple('ReadOptions', (
+    'head', 'compact', 'keep_raw', 'infer', 'sample', 'stats', 'multi_header',
+    'memo', 'columns', 'where',
+))
+_ReadOptions.__new__.__defaults__ = (None, False, True, None, None, None, False, None, None, None)
+
+
+class ReadOptions(_ReadOptions):
+    """
+    Options of reading a table, given as keyword arguments to WikiTable
+    attributes:
+     - head(list): Column names to use in place of the parsed header
+     - compact(bool): Read rows as wikitables.models.CompactRow objects,
+       sharing identical attrs dicts across fields
+     - keep_raw(bool): Retain raw nodes of the table, rows and fields
+     - infer(callable): Type inference of field values, given a string and
+       returning a typed value; defaults to wikitables.inference.TypeInferer
+     - sample(int): Decide once per column whether values are inferred, from
+       the first `sample` values of each column
+     - stats(wikitables.stats.ImportStats): Optional timing and counters
+     - multi_header(bool): Combine stacked header rows into composite
+       column names
+     - memo(CellMemo): Optional memo of fields by cell source text, which
+       may be shared across tables. Compact readers without raw nodes share
+       fields read from the memo
+     - columns(list): Names of the only columns to read. Cells of other
+       columns are skipped, and only placed by their row and column spans
+     - where(dict): Read only rows matching all of the given column values,
+       or predicates called with a column value. Rows are tested once their
+       key columns are read, before reading any other column; rows a
+       predicate raises TypeError, AttributeError or ValueError for, as
+       when called with a value of another type, do not match
+    """
+    __slots__ = ()
+
+
+class CellMemo(object):
+    """
+    Bounded LRU memo of fields read from cells, keyed on the cell's source
+    text and attributes, language and type inference. May be shared across
+    tables, see WikiTable
+    attributes:
+     - maxsize(int): Maximum number of cells retained
+     - hits(int): Number of cells read from the memo
+     - misses(int): Number of cells read and added to the memo
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @property
+    def hit_rate(self):
+        """ Fraction of cells read from the memo """
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key, entry):
+        self._entries[key] = entry
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FieldReader(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Stateful Field value reader
+    params:
+     - infer(callable): Type inference of joined field values; defaults to
+       the wikitables.inference.TypeInferer for lang
+     - stats(wikitables.stats.ImportStats): Optional template timing and counts
+     - memo(CellMemo): Optional memo of fields by cell source text
+     - share(bool): Return the same Field objects, without raw nodes, for
+       cells read from the memo
+    """
+
+    def __init__(self, lang='en', infer=None, stats=None, memo=None, share=False):
         self.lang = lang
-        try:
-            language_translation = gettext.translation(
-                'iso3166', pycountry.LOCALES_DIR, languages=[lang]
-            )
-            language_translation.install()
-        except FileNotFoundError:
-            language_translation = gettext
-        self.translate_fn = language_translation.gettext
+        self.translate_fn = get_translation(lang).gettext
+        self.infer = infer if infer is not None else type_inferer(lang).guess
+        self.stats = stats
+        self.memo = memo
+        self.share = share
+        self._read_template = read_template if stats is None else self._timed_read_template
 
         self._attrs = {} # node attribute state
 
     def parse(self, node):
         """
-        Return generator yielding Field objects for a given node
+        Return a list of Field objects for a given node
         """
+        if isinstance(node, FastCell):
+            # read by the line-oriented tokenizer
+            joined = ' '.join(node.parts)
+            return [Field(node.raw, self.infer(joined) if joined else "", dict(node.attrs))]
+        if self.memo is None:
+            return list(self._parse(node))
+
+        contents = ustr(node.contents).strip(' \n\t') if node.contents is not None else ''
+        key = (contents, ''.join(ustr(a) for a in node.attributes), self.lang, self.infer)
+        entry = self.memo.get(key)
+        if entry is not None:
+            if self.share:
+                return entry
+            return [Field(node, f.value, dict(f.attrs)) for f in entry]
+
+        fields = list(self._parse(node))
+        # fields read from templates within the cell have their own raw nodes
+        if all(f.raw is node for f in fields):
+            entry = [Field(None, f.value, dict(f.attrs)) for f in fields]
+            self.memo.set(key, entry)
+            if self.share:
+                return entry
+        return fields
+
+    def _parse(self, node):
         self._attrs = {}
         vals = []
         yielded = False
@@ -54,7 +172,7 @@ class FieldReader(object):
         joined = ' '.join([x for x in vals if x])
         if joined:
             yielded = True
-            yield Field(node, guess_type(joined), self._attrs)
+            yield Field(node, self.infer(joined), self._attrs)
 
         if not yielded:
             yield Field(node, "", self._attrs)
@@ -73,7 +191,7 @@ class FieldReader(object):
 
     def _read_part(self, node):
         if isinstance(node, Template):
-            for x in read_template(node, self.translate_fn):
+            for x in self._read_template(node, self.translate_fn):
                 yield x
             return
         if isinstance(node, Tag):
@@ -89,6 +207,13 @@ class FieldReader(object):
 
         yield node
 
+    def _timed_read_template(self, node, translate_fn):
+        start = time.perf_counter()
+        values = read_template(node, translate_fn)
+        self.stats.times['templates'] += time.perf_counter() - start
+        self.stats.templates[ustr(node.name).strip()] += 1
+        return values
+
     @staticmethod
     def _exclude_tag(node):
         # exclude tag nodes with attributes in ignore_attrs
@@ -104,55 +229,365 @@ class FieldReader(object):
         return False
 
 
-class RowReader(object):
-    """ Stateful Row reader """
+def read_table_nodes(table):
+    """
+    Return a (header cells, rows) tuple for a table node, from a single
+    non-recursive pass over its contents. Header cells are `th` nodes
+    outside of any row, and rows a list of wikitables.models.RowNodes.
+    Cells of a wikitables.fastpath.FastTable are returned as tokenized
+    """
+    if isinstance(table, FastTable):
+        return list(table.head), list(table.rows)
+    return read_row_nodes(table)
+
+
+def detach_rows(table):
+    """
+    Remove the rows read by read_table_nodes() from a table node, leaving
+    each row referenced only by its RowNodes
+    """
+    if isinstance(table, FastTable):
+        del table.rows[:]
+        return
+    detach_row_nodes(table)
+
+
+class TableLayout(object):
+    """
+    Stateful grid layout of table cells, resolving the column positions of
+    fields spanning multiple rows(`rowspan`) and columns(`colspan`)
+    """
+
+    def __init__(self):
+        # per column position, a [remaining rows, field] pair or None
+        self._spans = []
+
+    def place(self, fields):
+        """
+        Place a row of fields into the first free column positions, left to
+        right, returning a list of fields by column position. Positions
+        without a field are None
+        """
+        spans = self._spans
+        cells = []
+        pos, idx = 0, 0
+        nfields = len(fields)
+
+        while idx < nfields or pos < len(spans):
+            span = spans[pos] if pos < len(spans) else None
+            if span is not None:
+                cells.append(span[1])
+                span[0] -= 1
+                if not span[0]:
+                    spans[pos] = None
+                pos += 1
+                continue
 
-    def __init__(self, tname, head, lang='en'):
+            if idx >= nfields:
+                cells.append(None)
+                pos += 1
+                continue
+
+            f = fields[idx]
+            idx += 1
+            colspan = _span_attr(f.attrs, 'colspan')
+            rowspan = _span_attr(f.attrs, 'rowspan')
+            for _ in range(colspan):
+                cells.append(f)
+                if pos < len(spans) and spans[pos] is not None:
+                    # a column held by an earlier rowspan is covered by this
+                    # cell, using up the span for this row
+                    spans[pos][0] -= 1
+                    if not spans[pos][0]:
+                        spans[pos] = None
+                if rowspan != 1:
+                    while len(spans) <= pos:
+                        spans.append(None)
+                    # a rowspan of 0 spans all remaining rows
+                    spans[pos] = [rowspan - 1 if rowspan > 0 else -1, f]
+                pos += 1
+
+        while spans and spans[-1] is None:
+            spans.pop()
+        while cells and cells[-1] is None:
+            cells.pop()
+        return cells
+
+
+# upper bounds of cell spans, as clamped by MediaWiki
+MAX_COLSPAN = 1000
+MAX_ROWSPAN = 65534
+
+
+def _span_attr(attrs, name):
+    try:
+        span = int(attrs.get(name, 1))
+    except ValueError:
+        return 1
+    if name == 'colspan':
+        return min(span, MAX_COLSPAN) if span > 0 else 1
+    # a rowspan of 0 is kept, spanning all remaining rows
+    return min(span, MAX_ROWSPAN) if span >= 0 else 1
+
+
+class RowReader(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Stateful Row reader
+    params:
+     - keep_grid(bool): Retain the resolved cell grid, see relabel()
+     - options(ReadOptions): Options of reading rows; head and multi_header
+       are not read
+    """
+
+    def __init__(self, tname, head, lang='en', keep_grid=False, options=None):
+        if options is None:
+            options = ReadOptions()
         self.head = head
+        self.columns = options.columns
+        self.where = options.where
         self.lang = lang
+        self.compact = compact = options.compact
+        self.keep_raw = keep_raw = options.keep_raw
+        self.stats = stats = options.stats
+        self.grid = [] if keep_grid else None
+        self._grid_rows = []
+        self._head_index = None
+        self._selection = None
+        self._attrs = {}
         self._idx = 0
         self._tname = tname
         # track spanned fields across rows
-        self._span = {}
-        self._nspan = defaultdict(int)
-        self._freader = FieldReader(lang)
+        self._layout = TableLayout()
+        self._sampler = None
+        infer = options.infer
+        if options.sample:
+            # values are left as strings, and inferred by column position
+            self._sampler = ColumnSampler(infer or type_inferer(lang).guess, options.sample)
+            infer = str
+        share = compact and not keep_raw and self._sampler is None
+        self._freader = FieldReader(lang, infer, stats, options.memo, share)
+
+    def parse(self, *rows):
+        """
+        Parse one or more rows, as RowNodes, yielding wikitables.Row objects
+        """
+        for rname, node, cells in self._read(rows):
+            row = self._make_row(rname, node, cells, self.stats)
+            if not row.is_null:
+                if self.stats is not None:
+                    self.stats.rows += 1
+                yield row
 
-    def parse(self, *nodes):
+    def read_columns(self, rows):
         """
-        Parse one or more `tr` nodes, yielding wikitables.Row objects
+        Read an iterable of rows, as RowNodes, straight into typed columns,
+        without building any rows. Returns an OrderedDict mapping the names
+        of the columns read to wikitables.columns.Column objects
         """
-        for n in nodes:
-            if not n.contents:
+        selected = self._select()[0]
+        positions = [pos for pos in range(len(self.head))
+                     if selected is None or pos in selected]
+        builders = [ColumnBuilder(self.head[pos]) for pos in positions]
+        for rname, _, cells in self._read(rows):
+            self._check_fields(rname, cells, self.stats)
+            ncells = len(cells)
+            values = [cells[pos].value if pos < ncells and cells[pos] is not None else None
+                      for pos in positions]
+            # null rows are skipped, as by parse()
+            if all(v is None or v == '' for v in values):
                 continue
-            row = self._parse(n)
+            if self.stats is not None:
+                self.stats.rows += 1
+            for builder, value in zip(builders, values):
+                builder.append(value)
+        return OrderedDict((b.name, b.finish()) for b in builders)
+
+    def relabel(self, head):
+        """
+        Rebuild rows from the retained cell grid under a new head, without
+        re-parsing any nodes. Requires a reader created with keep_grid=True
+        """
+        if self.grid is None:
+            raise ValueError('relabel requires a reader with keep_grid enabled')
+        self.head = head
+        for (rname, node), cells in zip(self._grid_rows, self.grid):
+            # fields of relabeled rows were counted when first read
+            row = self._make_row(rname, node, cells, None)
             if not row.is_null:
                 yield row
 
-    def _parse(self, node):
+    def _read(self, rows):
+        # (row name, node, cells by column position) of each row read
+        for r in rows:
+            if not r.node.contents:
+                continue
+            if self.columns is None and self.where is None:
+                read = self._parse(r.node, r.cells)
+            else:
+                read = self._parse_selected(r.node, r.cells)
+            if read is not None:
+                yield read
+
+    def _parse(self, node, cells):
         rname = '%s[%s]' % (self._tname, self._idx)
         self._idx += 1
-        r = Row(rname, node)
-        cols = node.contents.ifilter_tags(matches=ftag('th', 'td'))
-        fields = [f for col in cols for f in self._freader.parse(col)]
+        fields = [f for col in cells for f in self._freader.parse(col)]
+        if self.stats is not None:
+            self.stats.cells += len(fields)
+        if not self.keep_raw:
+            node = None
+            for f in fields:
+                f.raw = None
+        if self.compact:
+            for f in fields:
+                f.attrs = self._attrs.setdefault(tuple(f.attrs.items()), f.attrs)
+        cells = self._layout.place(fields)
+        if self._sampler is not None:
+            self._sampler.apply(cells)
+        if self.grid is not None:
+            self.grid.append(cells)
+            self._grid_rows.append((rname, node))
+        return rname, node, cells
+
+    def _parse_selected(self, node, cells):
+        rname = '%s[%s]' % (self._tname, self._idx)
+        self._idx += 1
+        selected, keys = self._select()
 
-        for col_name in self.head:
-            if self._nspan[col_name]:
-                r[col_name] = self._span[col_name]
-                self._nspan[col_name] -= 1
-                continue
+        fields = []
+        for col in cells:
+            if _reads_fields(col):
+                # cells of several fields are read in full, to be placed
+                fields.extend(self._read_fields(col))
+            else:
+                fields.append(Field(col, _unread, _cell_attrs(col)))
+        cells = self._layout.place(fields)
+
+        if self._sampler is None and not self._matches(cells, keys):
+            return None
+        positions = range(len(cells)) if selected is None else selected
+        for pos in positions:
+            self._read_at(cells, pos)
+        if self._sampler is not None:
+            # sampled values are only typed once the row is read
+            for pos, _ in keys:
+                self._read_at(cells, pos)
+            self._sampler.apply(cells)
+            if not self._matches(cells, keys):
+                return None
+        if selected is not None:
+            cells = [f if pos in selected else None for pos, f in enumerate(cells)]
+            while cells and cells[-1] is None:
+                cells.pop()
+
+        if not self.keep_raw:
+            node = None
+        if self.grid is not None:
+            self.grid.append(cells)
+            self._grid_rows.append((rname, node))
+        return rname, node, cells
+
+    def _matches(self, cells, keys):
+        return all(_match(self._read_at(cells, pos), test) for pos, test in keys)
+
+    def _read_at(self, cells, pos):
+        # read a skipped cell placed at the given column position, in place
+        f = cells[pos] if pos is not None and pos < len(cells) else None
+        if f is None or f.value is not _unread:
+            return f
+        read = self._read_fields(f.raw)[0]
+        f.value, f.attrs, f.raw = read.value, read.attrs, read.raw
+        return f
+
+    def _read_fields(self, col):
+        fields = self._freader.parse(col)
+        if self.stats is not None:
+            self.stats.cells += len(fields)
+        if not self.keep_raw:
+            for f in fields:
+                f.raw = None
+        if self.compact:
+            for f in fields:
+                f.attrs = self._attrs.setdefault(tuple(f.attrs.items()), f.attrs)
+        return fields
+
+    def _select(self):
+        # positions of selected columns, or None for all, and where tests
+        # by column position, for the current head
+        if self._selection is None or self._selection[0] is not self.head:
+            selected = None
+            if self.columns is not None:
+                columns = set(self.columns)
+                selected = {pos for pos, name in enumerate(self.head) if name in columns}
+            # rows are keyed on the last column of a name
+            positions = {name: pos for pos, name in enumerate(self.head)}
+            keys = [(positions.get(name), test) for name, test in (self.where or {}).items()]
+            self._selection = (self.head, selected, keys)
+        return self._selection[1:]
+
+    def _make_row(self, rname, node, cells, stats):
+        self._check_fields(rname, cells, stats)
+        ncells = len(cells)
+        fields = [cells[pos] if pos < ncells else None for pos in range(len(self.head))]
+        if self.compact:
+            return CompactRow(rname, node, self._index(), tuple(fields))
 
-            if not fields:
-                log.warning('%s: missing field for column [%s]', r.name, col_name)
-                continue
+        r = Row(rname, node)
+        for col_name, f in zip(self.head, fields):
+            if f is not None:
+                r[col_name] = f
+        return r
 
-            f = fields.pop(0)
-            if 'rowspan' in f.attrs:
-                self._span[col_name] = f
-                self._nspan[col_name] = int(f.attrs['rowspan'])-1
+    def _check_fields(self, rname, cells, stats):
+        # warn of fields missing for a column read, or beyond the head
+        selected = self._select()[0]
+        ncells = len(cells)
+        for pos, col_name in enumerate(self.head):
+            if pos >= ncells or cells[pos] is None:
+                if selected is None or pos in selected:
+                    log.warning('%s: missing field for column [%s]', rname, col_name)
+                    if stats is not None:
+                        stats.missing_fields += 1
+
+        last = None
+        for f in cells[len(self.head):]:
+            if f is not None and f is not last:
+                log.warning('%s: dropping field from unknown column: %s', rname, f)
+                if stats is not None:
+                    stats.dropped_fields += 1
+            last = f
+
+    def _index(self):
+        # header index shared by all compact rows with the same head
+        if self._head_index is None or self._head_index[0] is not self.head:
+            index = {col_name: pos for pos, col_name in enumerate(self.head)}
+            self._head_index = (self.head, index)
+        return self._head_index[1]
+
+
+def _reads_fields(cell):
+    # whether a cell holds templates read as several fields
+    if isinstance(cell, FastCell) or cell.contents is None:
+        return False
+    return any(reads_fields(t) for t in cell.contents.ifilter_templates())
 
-            r[col_name] = f
 
-        for f in fields:
-            log.warning('%s: dropping field from unknown column: %s', r.name, f)
+def _cell_attrs(cell):
+    if isinstance(cell, FastCell):
+        return dict(cell.attrs)
+    return {ustr(a.name): ustr(a.value) for a in cell.attributes}
 
-        return r
+
+def _match(field, test):
+    # rows missing a key column never match
+    if field is None:
+        return False
+    if callable(test):
+        try:
+            return test(field.value)
+        except (TypeError, AttributeError, ValueError):
+            # values of mixed type columns a predicate does not apply to,
+            # such as text compared with a number or a number given to a
+            # string method
+            return False
+    return field.value == test
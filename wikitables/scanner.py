@@ -0,0 +1,105 @@
+# Fast table region scanner
+import re
+import logging
+
+import mwparserfromhell as mwp
+
+from wikitables.util import ftag
+
+
+log = logging.getLogger('wikitables')
+
+_token_re = re.compile(
+    r'^[ \t]*(?P<wiki>\{\||\|\}(?!\}))'
+    r'|<(?P<close>/?)table\b[^>]*>'
+    r'|(?P<comment><!--)'
+    r'|<(?P<verbatim>nowiki|pre|source|syntaxhighlight|math)\b[^>]*?(?P<selfclose>/?)>',
+    re.M | re.I
+)
+
+
+def scan_tables(text):
+    """
+    Locate wiki(`{| ... |}`) and html(`<table> ... </table>`) table regions
+    in the given wikitext, skipping comments and verbatim tags. Returns a
+    list of (start, end, depth) tuples in document order, with nested tables
+    following their parent, or None if the markup could not be scanned
+    reliably
+    """
+    spans = []
+    stack = []  # (kind, start, span index)
+    pos = 0
+
+    while True:
+        m = _token_re.search(text, pos)
+        if m is None:
+            break
+        pos = m.end()
+
+        if m.group('comment'):
+            end = text.find('-->', pos)
+            pos = len(text) if end == -1 else end + 3
+            continue
+
+        verbatim = m.group('verbatim')
+        if verbatim:
+            if not m.group('selfclose'):
+                end = re.compile(r'</%s\b' % verbatim, re.I).search(text, pos)
+                pos = len(text) if end is None else end.start()
+            continue
+
+        if m.group('wiki'):
+            kind, opening = 'wiki', m.group('wiki') == '{|'
+            start = m.start('wiki')
+        else:
+            kind, opening = 'html', not m.group('close')
+            start = m.start()
+
+        if opening:
+            stack.append((kind, start, len(spans)))
+            spans.append(None)
+            continue
+
+        if not stack:
+            # closing markup outside of any table is not treated as a table
+            continue
+        if stack[-1][0] != kind:
+            log.debug('unbalanced %s table markup at offset %d', kind, start)
+            return None
+        _, tstart, idx = stack.pop()
+        spans[idx] = (tstart, pos, len(stack))
+
+    if stack:
+        log.debug('unclosed %s table markup at offset %d', *stack[-1][:2])
+        return None
+
+    return spans
+
+
+def parse_tables(text):
+    """
+    Return all table nodes within the given wikitext, as would be returned
+    by filter_tags() over the entire parsed text. Only table regions found by
+    scan_tables() are handed to the parser, falling back to parsing the full
+    text where the markup could not be scanned
+    """
+    return list(iter_tables(text))
+
+
+def iter_tables(text):
+    """
+    Generator form of parse_tables(), parsing each table region only as
+    it is consumed
+    """
+    spans = scan_tables(text)
+    if spans is None:
+        for table in mwp.parse(text).filter_tags(matches=ftag('table')):
+            yield table
+        return
+
+    for start, end, depth in spans:
+        if depth:
+            # nested tables are returned from parsing their parent
+            continue
+        for table in mwp.parse(text[start:end]).filter_tags(matches=ftag('table')):
+            yield table
@@ -0,0 +1,125 @@
+# Table and row serialization
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+STDLIB = 'json'
+ORJSON = 'orjson'
+
+_dumps = json.JSONEncoder().encode
+_dumps_ndjson = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+
+
+def row_values(row):
+    """ Return a plain dict mapping field names to values for a single row """
+    return {k: f.value for k, f in row.items()}
+
+
+def table_values(rows):
+    """ Return a list of plain value dicts for an iterable of rows """
+    return [{k: f.value for k, f in row.items()} for row in rows]
+
+
+def dumps_row(row, backend=None):
+    """ Return the JSON encoding of a single row """
+    return _encoder(backend)(row_values(row))
+
+
+def dumps_rows(rows, backend=None):
+    """ Return the JSON encoding of a list of rows """
+    return _encoder(backend)(table_values(rows))
+
+
+def dump_rows(rows, fp, backend=None):
+    """
+    Write the JSON encoding of a list of rows to a file-like object, one row
+    at a time. Output is identical to dumps_rows()
+    """
+    encode = _encoder(backend)
+    sep = ', ' if backend != ORJSON else ','
+    fp.write('[')
+    for n, row in enumerate(rows):
+        if n:
+            fp.write(sep)
+        fp.write(encode(row_values(row)))
+    fp.write(']')
+
+
+def dump_tables(tables, fp, pretty=False, backend=None):
+    """
+    Write a JSON object mapping table names to rows to a file-like object,
+    one table at a time
+    params:
+     - tables(iterable): WikiTable objects
+     - fp(file): Text file-like object to write to
+     - pretty(bool): Indent output
+     - backend(str): 'json', 'orjson' or None for the standard library encoder
+    """
+    if pretty:
+        fp.write(json.dumps({t.name: table_values(t.rows) for t in tables},
+                            indent=2, sort_keys=False))
+        return
+
+    encode = _encoder(backend)
+    sep, colon = (', ', ': ') if backend != ORJSON else (',', ':')
+    fp.write('{')
+    for n, table in enumerate(tables):
+        if n:
+            fp.write(sep)
+        fp.write(encode(table.name))
+        fp.write(colon)
+        dump_rows(table.rows, fp, backend)
+    fp.write('}')
+
+
+def dump_ndjson(tables, fp):
+    """
+    Write rows of the given tables to a file-like object as newline delimited
+    JSON, one {"table": <name>, "row": <values>} object per line. Encoded
+    with orjson where installed, and otherwise with equivalent compact,
+    non-ASCII-escaped output from the standard library
+    """
+    encode = _ndjson_encoder()
+    for table in tables:
+        for row in table.iter_rows():
+            fp.write(encode({'table': table.name, 'row': row_values(row)}))
+            fp.write('\n')
+
+
+def dump_ndjson_tables(tables, fp, title=None):
+    """
+    Write the given tables to a file-like object as newline delimited JSON,
+    one {"title": <article title>, "table": <name>, "rows": [<values>]}
+    object per table, encoded as by dump_ndjson()
+    """
+    encode = _ndjson_encoder()
+    for table in tables:
+        fp.write(encode({'title': title, 'table': table.name,
+                         'rows': table_values(table.iter_rows())}))
+        fp.write('\n')
+
+
+def _encoder(backend):
+    if backend is None or backend == STDLIB:
+        return _dumps
+    if backend == ORJSON:
+        if orjson is None:
+            raise ImportError('orjson backend requested, but orjson is not installed')
+        return _orjson_dumps
+    raise ValueError('unknown json backend: %s' % backend)
+
+
+def _ndjson_encoder():
+    return _dumps_ndjson if orjson is None else _orjson_dumps
+
+
+def _orjson_dumps(obj):
+    try:
+        return orjson.dumps(obj).decode('utf-8')
+    except TypeError:
+        # orjson only encodes integers within 64 bits
+        return _dumps_ndjson(obj)
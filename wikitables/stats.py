@@ -0,0 +1,133 @@
+# pylint: disable=useless-object-inheritance
+# Import timing and counters
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+
+# import stages, in reporting order. template reading is timed within rows
+STAGES = ('fetch', 'parse', 'header', 'rows', 'templates', 'serialize')
+
+
+class _NullTimer(object):
+    """ No-op context manager, shared by timed() when stats are off """
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc):
+        return False
+
+
+_null_timer = _NullTimer()
+
+
+class ImportStats(object):  # pylint: disable=too-many-instance-attributes
+    """
+    Opt-in timing and counters of table imports, collected when passed as
+    `stats` to import_tables(), WikiTable or Client
+    attributes:
+     - times(OrderedDict): Wall time in seconds by stage; one of 'fetch',
+       'parse', 'header', 'rows', 'templates' or 'serialize'
+     - requests(int): Number of API requests made
+     - bytes_fetched(int): Size of API responses in bytes
+     - tables(int): Number of tables read
+     - rows(int): Number of rows read
+     - cells(int): Number of fields read
+     - missing_fields(int): Number of row fields missing for a header column
+     - dropped_fields(int): Number of fields dropped from unknown columns
+     - templates(collections.Counter): Number of templates read, by name
+    """
+
+    def __init__(self):
+        self.times = OrderedDict((stage, 0.0) for stage in STAGES)
+        self.requests = 0
+        self.bytes_fetched = 0
+        self.tables = 0
+        self.rows = 0
+        self.cells = 0
+        self.missing_fields = 0
+        self.dropped_fields = 0
+        self.templates = Counter()
+
+    @contextmanager
+    def timer(self, stage):
+        """ Context manager adding its wall time to the given stage """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.times[stage] += time.perf_counter() - start
+
+    def merge(self, other):
+        """ Add the timings and counters of another ImportStats """
+        for stage, seconds in other.times.items():
+            self.times[stage] += seconds
+        self.requests += other.requests
+        self.bytes_fetched += other.bytes_fetched
+        self.tables += other.tables
+        self.rows += other.rows
+        self.cells += other.cells
+        self.missing_fields += other.missing_fields
+        self.dropped_fields += other.dropped_fields
+        self.templates.update(other.templates)
+
+    def as_dict(self):
+        """ Return stats as plain values """
+        return {
+            'times': dict(self.times),
+            'requests': self.requests,
+            'bytes_fetched': self.bytes_fetched,
+            'tables': self.tables,
+            'rows': self.rows,
+            'cells': self.cells,
+            'missing_fields': self.missing_fields,
+            'dropped_fields': self.dropped_fields,
+            'templates': dict(self.templates),
+        }
+
+    def report(self):
+        """ Return a human readable summary """
+        lines = []
+        for stage, seconds in self.times.items():
+            indent = '  ' if stage == 'templates' else ''
+            lines.append('%-12s %9.4fs' % (indent + stage, seconds))
+        lines.append('requests: %d  bytes fetched: %d' % (self.requests, self.bytes_fetched))
+        lines.append('tables: %d  rows: %d  cells: %d' % (self.tables, self.rows, self.cells))
+        lines.append('missing fields: %d  dropped fields: %d' % (
+            self.missing_fields, self.dropped_fields))
+        if self.templates:
+            lines.append('templates: ' + ', '.join(
+                '%s=%d' % item for item in self.templates.most_common()))
+        return '\n'.join(lines)
+
+
+def timed(stats, stage):
+    """
+    Return a context manager timing a stage into stats, or a shared no-op
+    context manager if stats is None
+    """
+    if stats is None:
+        return _null_timer
+    return stats.timer(stage)
+
+
+def timed_iter(stats, stage, iterable):
+    """
+    Iterate over an iterable, timing each step into the given stage of
+    stats. Returns the iterable unchanged if stats is None
+    """
+    if stats is None:
+        return iterable
+    return _timed_iter(stats, stage, iter(iterable))
+
+
+def _timed_iter(stats, stage, iterator):
+    while True:
+        with stats.timer(stage):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -0,0 +1,451 @@
+# Parsed Wikipedia table
+import io
+import logging
+from collections import deque
+from functools import partial
+
+import mwparserfromhell as mwp
+
+from wikitables.columns import build_columns, to_arrow, to_pandas
+from wikitables import fastpath
+from wikitables.models import Field, Row, LazyNode
+from wikitables.readers import ReadOptions, RowReader, TableLayout, detach_rows, read_table_nodes
+from wikitables import serialize
+from wikitables.stats import timed
+from wikitables.util import ftag, ustr
+
+
+log = logging.getLogger('wikitables')
+
+
+def _parse_table(source):
+    return mwp.parse(source).filter_tags(matches=ftag('table'))[0]
+
+
+def _cell_name(node):
+    if isinstance(node, fastpath.FastCell):
+        return node.name.strip(' ')
+    return ustr(node.contents.strip_code().strip(' ')) if node.contents else ''
+
+
+def _cell_attrs(node):
+    if isinstance(node, fastpath.FastCell):
+        return dict(node.attrs)
+    return {ustr(a.name).strip(): ustr(a.value) for a in node.attributes}
+
+
+class WikiTable():  # pylint: disable=too-many-instance-attributes
+    """
+    Parsed Wikipedia table
+    attributes:
+     - name(str): Table name in the format <article_name>[<table_index>]
+     - head(list): List of parsed column names as strings
+     - rows(list): List of <wikitables.Row> objects
+     - grid(list): Resolved cell grid of <wikitables.Field> objects
+     - options(wikitables.readers.ReadOptions): Options the table is read with
+    params:
+     - lazy(bool): Read rows on first access
+     - stream(bool): Read rows only as iterated, see iter_rows()
+     - options: Keyword arguments of wikitables.readers.ReadOptions. With
+       columns, head lists and is set by the selected columns only
+    """
+    def __init__(self, name, raw_table, lang='en', lazy=False, stream=False, **options):
+        self.name = ustr(name)
+        self.lang = lang
+        self.options = options = ReadOptions(**options)
+        self._rows = None
+        self._head = []
+        self._node = raw_table
+        self._tr_nodes = None
+        self._stream = stream
+        self._reader = None
+        self._source = None
+        self._reparsed = None
+        self._reparsed_rows = None
+        if options.stats is not None:
+            options.stats.tables += 1
+        with timed(options.stats, 'header'):
+            # a single pass over the table's rows, shared with row reading
+            flat_cells, self._tr_nodes = read_table_nodes(raw_table)
+            self._read_header(flat_cells, options.head)
+        if stream:
+            # row nodes are only referenced from here, and released as read
+            detach_rows(raw_table)
+            self._tr_nodes = deque(self._tr_nodes)
+            self._node = None
+        elif not lazy:
+            self._read_rows()
+
+    @classmethod
+    def load(cls, data):
+        """
+        Rehydrate a table from the output of WikiTable.dump(), without
+        invoking the parser. Raw nodes are re-parsed lazily on first access
+        """
+        table = cls.__new__(cls)
+        table.name = data['name']
+        table.lang = data['lang']
+        table.options = ReadOptions(multi_header=data.get('multi_header', False),
+                                    columns=data.get('columns'))
+        table._head = data['head']
+        table._node = None
+        table._tr_nodes = None
+        table._stream = False
+        table._reader = None
+        table._source = data['source']
+        table._reparsed = None
+        table._reparsed_rows = None
+        table._rows = []
+        # fields are resolved by column position, kept across relabeling
+        positions = {name: pos for pos, name in enumerate(table._head)}
+        for rname, fields in data['rows']:
+            row = Row(rname, LazyNode(partial(table._resolve_raw, rname)))
+            for col_name, value, attrs in fields:
+                node = LazyNode(partial(table._resolve_raw, rname, positions[col_name]))
+                row[col_name] = Field(node, value, attrs)
+            table.rows.append(row)
+        return table
+
+    def dump(self):
+        """
+        Return the parsed table as plain, picklable values
+        """
+        return {
+            'name': self.name,
+            'lang': self.lang,
+            'head': list(self._head),
+            'columns': self.options.columns,
+            'multi_header': self.options.multi_header,
+            'source': ustr(self._node) if self._node is not None else self._source,
+            'rows': [
+                (row.name, [(k, f.value, f.attrs) for k, f in row.items()])
+                for row in self.rows
+            ],
+        }
+
+    def json(self, backend=None):
+        """
+        Return table rows as a JSON string
+        params:
+         - backend(str): 'orjson' to encode with orjson; defaults to the
+           standard library encoder
+        """
+        return serialize.dumps_rows(self.rows, backend)
+
+    def dump_json(self, fp, backend=None):
+        """ Write table rows as JSON to a file-like object, one row at a time """
+        serialize.dump_rows(self.iter_rows(), fp, backend)
+
+    def ndjson(self, fp=None):
+        """
+        Write table rows as newline delimited JSON to a file-like object, or
+        return them as a string if none is given
+        """
+        if fp is None:
+            buf = io.StringIO()
+            serialize.dump_ndjson([self], buf)
+            return buf.getvalue()
+        serialize.dump_ndjson([self], fp)
+        return None
+
+    def to_columns(self):
+        """
+        Return an OrderedDict mapping column names to typed
+        wikitables.columns.Column objects. Columns of tables with rows
+        already read are built from those rows; cell values of tables not
+        yet read are read straight into columns, without building rows.
+        Rows of streamed tables are consumed
+        """
+        if self._stream:
+            return self._stream_reader().read_columns(self._pop_rows())
+        if self._rows is not None or self._tr_nodes is None:
+            head = self.head
+            values = ([row[k].value if k in row else None for k in head]
+                      for row in self.rows)
+            return build_columns(head, values)
+        return self._row_reader().read_columns(self._tr_nodes)
+
+    def to_arrow(self):
+        """ Return table as a pyarrow.Table """
+        return to_arrow(self.to_columns())
+
+    def to_pandas(self):
+        """ Return table as a pandas.DataFrame with nullable column types """
+        return to_pandas(self.to_columns())
+
+    @property
+    def rows(self):
+        # rows of lazily imported tables are read on first access
+        if self._rows is None:
+            self._read_rows()
+        return self._rows
+
+    @rows.setter
+    def rows(self, val):
+        self._rows = val
+
+    @property
+    def grid(self):
+        """
+        Resolved cell grid, as a list per table row of wikitables.Field
+        objects by column position. Fields spanning multiple rows or columns
+        are repeated in each position they occupy; empty positions are None
+        """
+        if self._stream:
+            return None
+        if self._reader is not None:
+            return self._reader.grid
+        if self._tr_nodes is None:
+            return self._reparse().grid
+        self._read_rows()
+        return self._reader.grid
+
+    @property
+    def head(self):
+        columns = self.options.columns
+        if columns is not None:
+            return [name for name in self._head if name in columns]
+        return self._head
+
+    @head.setter
+    def head(self, val):
+        if not isinstance(val, list):
+            raise ValueError('table head must be provided as list')
+        if self.options.columns is not None:
+            val = self._relabel_selected(val)
+        old_head, self._head = self._head, val
+        if self._stream or self._rows is None:
+            # rows not yet read will be read with the new head
+            return
+        if self._reader is not None:
+            # relabel previously parsed cells, without re-parsing
+            self._reader.columns = self.options.columns
+            self._reader.where = self.options.where
+            self.rows = list(self._reader.relabel(val))
+            return
+        if self._tr_nodes is None and len(val) <= len(old_head):
+            # relabel the fields of a rehydrated table by column position
+            self.rows = self._relabel_rows(old_head, val)
+            return
+        if self._tr_nodes is None:
+            # re-read the nodes of a rehydrated table, naming more columns
+            self._node = _parse_table(self._source)
+            flat_cells, self._tr_nodes = read_table_nodes(self._node)
+            self._read_header(flat_cells, val)
+        self._read_rows()
+
+    def _relabel_rows(self, old_head, head):
+        # fields of each row are keyed on the last column of a name
+        positions = {name: pos for pos, name in enumerate(old_head)}
+        rows = []
+        for row in self._rows:
+            relabeled = Row(row.name, row._raw)  # pylint: disable=protected-access
+            for name, f in row.items():
+                relabeled[head[positions[name]]] = f
+            rows.append(relabeled)
+        return rows
+
+    def _relabel_selected(self, val):
+        # map names given for the selected columns onto the full head,
+        # renaming the selected columns and where keys alike
+        columns = self.options.columns
+        positions = [pos for pos, name in enumerate(self._head) if name in columns]
+        if len(val) != len(positions):
+            raise ValueError('table head must name each of the %d selected columns' %
+                             len(positions))
+        head, renamed = list(self._head), {}
+        for pos, name in zip(positions, val):
+            renamed[head[pos]] = name
+            head[pos] = name
+        where = self.options.where
+        if where is not None:
+            where = {renamed.get(k, k): test for k, test in where.items()}
+        self.options = self.options._replace(
+            columns=[renamed.get(k, k) for k in columns], where=where)
+        return head
+
+    def __repr__(self):
+        return "<WikiTable '%s'>" % self.name
+
+    def _log(self, value):
+        log.debug('%s: %s', self.name, value)
+
+    def _reparse(self):
+        # parse the source of a rehydrated table
+        if self._reparsed is None:
+            self._reparsed = WikiTable(self.name, _parse_table(self._source), self.lang,
+                                       multi_header=self.options.multi_header)
+        return self._reparsed
+
+    def _resolve_raw(self, rname, pos=None):
+        reparsed = self._reparse()
+        if reparsed.head != self._head:
+            reparsed.head = list(self._head)
+            self._reparsed_rows = None
+        if self._reparsed_rows is None:
+            # rows of tables read with where are a subset of the reparsed rows
+            self._reparsed_rows = {row.name: row for row in reparsed.rows}
+        row = self._reparsed_rows[rname]
+        if pos is None:
+            return row.raw
+        return row[self._head[pos]].raw
+
+    def iter_rows(self):
+        """
+        Return an iterator over table rows. Rows not yet read are parsed as
+        they are consumed without being retained; for tables imported with
+        stream=True, each row node is released once read
+        """
+        if self._rows is not None:
+            return iter(self._rows)
+        return self._parse_rows()
+
+    def _parse_rows(self, keep_grid=False):
+        if not self._stream:
+            reader = self._row_reader(keep_grid)
+            if keep_grid:
+                self._reader = reader
+            for row in reader.parse(*self._tr_nodes):
+                yield row
+            return
+
+        reader = self._stream_reader()
+        while self._tr_nodes:
+            # rows are read in full before yielding, releasing their node
+            for row in list(reader.parse(self._tr_nodes.popleft())):
+                yield row
+
+    def _stream_reader(self):
+        # rowspan state is kept across iterators of a streamed table
+        if self._reader is None or self._reader.head is not self._head:
+            self._reader = self._row_reader()
+        return self._reader
+
+    def _pop_rows(self):
+        while self._tr_nodes:
+            yield self._tr_nodes.popleft()
+
+    def _row_reader(self, keep_grid=False):
+        return RowReader(self.name, self._head, self.lang, keep_grid, self.options)
+
+    def _read_rows(self):
+        with timed(self.options.stats, 'rows'):
+            self.rows = list(self._parse_rows(keep_grid=True))
+        self._log('parsed %d rows %d cols' % (len(self.rows), len(self._head)))
+        if not self.options.keep_raw and not self._stream:
+            # release the parsed table, retaining only its source
+            self._source = ustr(self._node)
+            self._node = self._tr_nodes = None
+
+    def _read_header(self, flat_cells, head=None):
+        # header rows are located and excluded from rows, even if not read
+        if self.options.multi_header:
+            header_rows = self._find_header_rows(flat_cells)
+        else:
+            header_rows = self._find_header_flat(flat_cells) or self._find_header_row()
+        if head is not None:
+            self._head = list(head)
+            return
+        if not header_rows:
+            self._head = self._make_default_header()
+        elif self.options.multi_header:
+            self._head = self._make_composite_header(header_rows)
+        else:
+            self._head = self._make_header(header_rows[0])
+
+    def _find_header_flat(self, flat_cells):
+        """
+        Find header elements in a table, if possible. This case handles
+        situations where '<th>' elements are not within a row('<tr>')
+        """
+        if not flat_cells:
+            return None
+        self._log('found header outside rows (%d <th> elements)' % len(flat_cells))
+        return [flat_cells]
+
+    def _find_header_row(self):
+        """
+        Evaluate all rows and determine header position, based on
+        greatest number of 'th' tagged elements
+        """
+        th_max = 0
+        header_idx = 0
+        for idx, row in enumerate(self._tr_nodes):
+            if row.nth > th_max:
+                th_max = row.nth
+                header_idx = idx
+
+        if not th_max:
+            return None
+
+        self._log('found header at row %d (%d <th> elements)' % \
+                    (header_idx, th_max))
+
+        header_row = self._tr_nodes.pop(header_idx)
+        return [[c for c in header_row.cells if ustr(c.tag).lower() == 'th']]
+
+    def _find_header_rows(self, flat_cells):
+        """
+        Find stacked header rows; any header elements outside of rows,
+        followed by leading rows of only 'th' tagged elements. Falls back to
+        a single header row if there are none
+        """
+        header_rows = [flat_cells] if flat_cells else []
+        while self._tr_nodes and self._tr_nodes[0].nth and \
+                self._tr_nodes[0].nth == len(self._tr_nodes[0].cells):
+            header_rows.append(self._tr_nodes.pop(0).cells)
+        if not header_rows:
+            return self._find_header_row()
+        self._log('found %d header rows' % len(header_rows))
+        return header_rows
+
+    @staticmethod
+    def _make_header(cells):
+        """
+        Return column names of a single header row, numbering the columns
+        spanned by a header cell
+        """
+        fields = TableLayout().place([Field(n, _cell_name(n), _cell_attrs(n)) for n in cells])
+        head, last, count = [], None, 0
+        for f in fields:
+            count = count + 1 if f is last else 1
+            head.append(f.value if count == 1 else '%s_%d' % (f.value, count))
+            last = f
+        return head
+
+    def _make_composite_header(self, header_rows):
+        """
+        Return column names combining the names of stacked header rows, top
+        to bottom, with header cells spanning rows and columns resolved
+        """
+        layout = TableLayout()
+        grid = [layout.place([Field(n, _cell_name(n), _cell_attrs(n)) for n in cells])
+                for cells in header_rows]
+
+        head, seen = [], {}
+        for pos in range(max(len(cells) for cells in grid)):
+            parts, last = [], None
+            for cells in grid:
+                f = cells[pos] if pos < len(cells) else None
+                if f is not None and f is not last and f.value:
+                    parts.append(f.value)
+                last = f
+            name = ' '.join(parts)
+            # columns spanned by the same header cells are numbered
+            seen[name] = seen.get(name, 0) + 1
+            head.append(name if seen[name] == 1 else '%s_%d' % (name, seen[name]))
+        return head
+
+    def _make_default_header(self):
+        """
+        Return a generic placeholder header based on the tables column count
+        """
+        td_max = 0
+
+        for row in self._tr_nodes:
+            td_count = len(row.cells) - row.nth
+            if td_count > td_max:
+                td_max = td_count
+
+        self._log('creating default header (%d columns)' % td_max)
+        return ['column%d' % n for n in range(0, td_max)]
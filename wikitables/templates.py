@@ -1,25 +1,79 @@
 # Template readers
 import logging
 
-import pycountry
-
+from wikitables.countries import country_index
 from wikitables.util import ustr
 from wikitables.models import Field
 
 
 log = logging.getLogger('wikitables')
 
+_months = {
+    name: num for num, names in enumerate((
+        ('january', 'jan'), ('february', 'feb'), ('march', 'mar'), ('april', 'apr'),
+        ('may',), ('june', 'jun'), ('july', 'jul'), ('august', 'aug'),
+        ('september', 'sep', 'sept'), ('october', 'oct'), ('november', 'nov'),
+        ('december', 'dec')), 1)
+    for name in names
+}
+
+# words joining the values of a {{convert}} range
+_range_words = {'-', '–', 'to', 'and', 'or', 'x', 'by', '+/-', '±'}
+
 
 def read_template(node, translate_fn):
-    if node.name == 'refn':
-        log.debug('omitting refn subtext from field')
-        return []
-
-    for read_function in _tmpl_readers:
-        value = read_function(node, translate_fn)
-        if value:
-            return value
-    return []
+    """
+    Return a list of values and Field objects read from a template node, by
+    the reader registered for its name. Country code and name templates,
+    such as {{ITA}}, are read as the country name; any other template as the
+    concatenation of its unnamed arguments
+    """
+    name = normalize_name(node.name)
+    reader = _readers.get(name)
+    if reader is not None:
+        values = reader(node, translate_fn)
+        if values is not None:
+            return values
+
+    country = country_index().get(name)
+    if country is not None:
+        return [translate_fn(country.name)]
+
+    return _read_unknown_template(node, translate_fn)
+
+
+def register_template_reader(names, reader, multi=False):
+    """
+    Register a reader for templates of the given name, or list of names.
+    Names are matched as normalized by normalize_name(), and replace any
+    reader previously registered for them
+    params:
+     - reader(callable): Given a template node and a country name
+       translation function, returning a list of values and Field objects;
+       or None to read the template as an unknown template
+     - multi(bool): Whether the reader returns Field objects, each read as
+       a field of its own column
+    """
+    if isinstance(names, str):
+        names = [names]
+    for name in names:
+        name = normalize_name(name)
+        _readers[name] = reader
+        if multi:
+            _multi.add(name)
+        else:
+            _multi.discard(name)
+    return reader
+
+
+def reads_fields(node):
+    """ Return whether a template node is read as fields of several columns """
+    return normalize_name(node.name) in _multi
+
+
+def normalize_name(name):
+    """ Return a template name as matched by registered readers """
+    return ustr(name).strip().replace('_', ' ').lower()
 
 
 def _read_unknown_template(node, translate_fn):
@@ -31,11 +85,15 @@ def _read_unknown_template(node, translate_fn):
     return [concat]
 
 
+def _read_refn_template(node, translate_fn):
+    del node, translate_fn
+    log.debug('omitting refn subtext from field')
+    return []
+
+
 def _read_change_template(node, translate_fn):
     del translate_fn
 
-    if node.name != 'change':
-        return None
     params, args = _read_template_params(node)
     args = [int(ustr(a)) for a in args]
 
@@ -47,14 +105,58 @@ def _read_change_template(node, translate_fn):
     return [Field(node, args[0]), Field(node, args[1]), Field(node, change)]
 
 
-def _read_flag_template(node, translate_fn):
-    # read flag shorthand templates
-    sname = ustr(node.name)
+def _read_sort_template(node, translate_fn):
+    del translate_fn
+
+    # {{sort|key|display}}, read as its displayed text
+    _, args = _read_template_params(node)
+    if not args:
+        return None
+    return [ustr(args[1] if len(args) > 1 else args[0]).strip()]
+
+
+def _read_nts_template(node, translate_fn):
+    del translate_fn
+
+    # {{nts|number}}, a sortable number
+    _, args = _read_template_params(node)
+    if not args:
+        return None
+    return [ustr(args[0]).strip()]
+
+
+def _read_dts_template(node, translate_fn):
+    del translate_fn
+
+    # {{dts|year|month|day}} or {{dts|date}}, read as an ISO 8601 date
+    _, args = _read_template_params(node)
+    args = [ustr(a).strip() for a in args]
+    if len(args) == 1:
+        return args
+    if not 2 <= len(args) <= 3:
+        return None
     try:
-        country = pycountry.countries.lookup(sname)
-        return [translate_fn(country.name)]
-    except LookupError:
-        pass
+        year = int(args[0])
+        month = _months.get(args[1].lower()) or int(args[1])
+        if len(args) == 2:
+            return ['%04d-%02d' % (year, month)]
+        return ['%04d-%02d-%02d' % (year, month, int(args[2]))]
+    except ValueError:
+        return None
+
+
+def _read_convert_template(node, translate_fn):
+    del translate_fn
+
+    # {{convert|value|unit|...}} or {{convert|value|to|value|unit|...}},
+    # read as the original value and unit
+    _, args = _read_template_params(node)
+    args = [ustr(a).strip() for a in args]
+    if len(args) >= 4 and args[1] in _range_words:
+        return [' '.join(args[:4])]
+    if len(args) >= 2:
+        return [' '.join(args[:2])]
+    return None
 
 
 def _read_template_params(node):
@@ -67,8 +169,15 @@ def _read_template_params(node):
             args.append(param)
     return kvs, args
 
-_tmpl_readers = [
-    _read_change_template,
-    _read_flag_template,
-    _read_unknown_template
-]
+
+# readers by normalized template name
+_readers = {}
+# names of templates read as Field objects
+_multi = set()
+
+register_template_reader('refn', _read_refn_template)
+register_template_reader('change', _read_change_template, multi=True)
+register_template_reader('sort', _read_sort_template)
+register_template_reader('nts', _read_nts_template)
+register_template_reader('dts', _read_dts_template)
+register_template_reader(['convert', 'cvt'], _read_convert_template)